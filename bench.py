@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	generation-time benchmarks
+
+	usage: python bench.py [--max N] [--repeat R] [--only SUBSTRING] [--out FILE]
+
+	prints (or writes) a JSON document with one record per benchmark ; records
+	are keyed by name and size, so that runs on different commits can be
+	compared line by line.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+
+from primitives import Spiral
+from platonic import Cube, Dodecahedron
+
+SPIRALS = {
+	'Logarithmic': {'a':2, 'k':0.2},
+	'Archimedean': {'a':2},
+	'Fermat': {'a':2},
+	'Hyperbolic': {'a':2},
+	'Lituus': {'a':2},
+}
+
+def timed( func, repeat ):
+	""" best of `repeat` runs, in seconds """
+	best = float('inf')
+	for _ in range(repeat):
+		t = time.perf_counter()
+		func()
+		best = min( best, time.perf_counter()-t )
+	return best
+
+def sizes( maximum ):
+	n = 1000
+	while n <= maximum:
+		yield n
+		n *= 10
+
+def benchmarks( maximum ):
+	"""
+		yields ( name, n, func ) ; func runs the benchmark once
+	"""
+	for name, fargs in SPIRALS.items():
+		for n in sizes( maximum ):
+			yield f"spiral.{name}.build", n, lambda n=n, name=name, fargs=fargs: Spiral( n, (name, fargs) ).quats()
+
+	for n in sizes( min( maximum, 100000 ) ):
+		s = Spiral( n, ('Logarithmic', SPIRALS['Logarithmic']) )
+		picks = np.random.default_rng(0).integers( 0, n, 1000 ).tolist()
+		yield "point.quat.cold", n, lambda s=s, picks=picks: ( s.invalidate(), [ s.vertices[i].quat for i in picks ] )
+		yield "point.quat.warm", n, lambda s=s, picks=picks: [ s.vertices[i].quat for i in picks ]
+		yield "point.xyz.loop", n, lambda s=s: [ p.xyz for p in s.vertices ]
+		yield "polytope.xyz", n, lambda s=s: ( s.invalidate(), s.xyz() )
+
+	for cls in ( Cube, Dodecahedron ):
+		shape = cls()
+		yield f"{cls.__name__}.build", 1, lambda cls=cls: cls().quats()
+		yield f"{cls.__name__}.edges", 1, lambda shape=shape: [ (a.xyz, b.xyz) for a, b in shape.edges ]
+		yield f"{cls.__name__}.faces", 1, lambda shape=shape: [ [ a.xyz for a, b in face ] for face in shape.faces ]
+		yield f"{cls.__name__}.adjacency", 1, lambda shape=shape: ( shape.invalidate(), shape.adjacency() )
+
+def commit():
+	try:
+		return subprocess.run( ['git', 'describe', '--always', '--dirty'], capture_output = True, text = True, check = True,
+				cwd = os.path.dirname( os.path.abspath( __file__ ) ) ).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def run( maximum = 10**7, repeat = 3, only = None ):
+	results = []
+	for name, n, func in benchmarks( maximum ):
+		if only is not None and only not in name:
+			continue
+		results.append({ 'name': name, 'n': n, 'seconds': timed( func, 1 if n >= 10**6 else repeat ) })
+	return {
+		'commit': commit(),
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'machine': platform.machine(),
+		'results': results,
+	}
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser( description = "superslice generation-time benchmarks" )
+	parser.add_argument( '--max', type = float, default = 1e7, help = "largest vertex count (powers of ten from 1e3)" )
+	parser.add_argument( '--repeat', type = int, default = 3, help = "runs per benchmark, the best one is kept" )
+	parser.add_argument( '--only', help = "only run benchmarks whose name contains this" )
+	parser.add_argument( '--out', help = "write JSON here instead of stdout" )
+	args = parser.parse_args()
+
+	with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+		report = run( int(args.max), args.repeat, args.only )
+	if args.out:
+		with open( args.out, 'w' ) as fh:
+			json.dump( report, fh, indent = 1 )
+	else:
+		print( json.dumps( report, indent = 1 ) )
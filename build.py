@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	builds a list of shapes on all cores
+
+	shapes are given as specs ( cls, args, kwargs ) rather than instances, since
+	building the instances is precisely what we want to do in parallel ; a
+	worker builds its shape, evaluates it and hands its arrays back through
+	shared memory, so no Point (nor anything big) is ever pickled.
+
+	everything in a spec must be picklable (no lambda as Spiral func)
+"""
+
+import time
+from multiprocessing import Pool, shared_memory, resource_tracker
+import numpy as np
+import cache
+from primitives import Polytope
+
+def spec( cls, *args, **kwargs ):
+	"""
+		spec( Spiral, 12, ('Logarithmic', {'a':2, 'k':5}) )
+	"""
+	return ( cls, args, kwargs )
+
+def _share( array ):
+	shm = shared_memory.SharedMemory( create = True, size = max( array.nbytes, 1 ) )
+	np.ndarray( array.shape, array.dtype, buffer = shm.buf )[...] = array
+	shm.close()
+	# the parent unlinks it, the worker's resource tracker must not
+	resource_tracker.unregister( shm._name, 'shared_memory' )
+	return ( shm.name, array.shape, array.dtype.str )
+
+def _attach( shared ):
+	name, shape, dtype = shared
+	shm = shared_memory.SharedMemory( name = name )
+	try:
+		return np.ndarray( shape, dtype, buffer = shm.buf ).copy()
+	finally:
+		shm.close()
+		shm.unlink()
+
+def _discard( shared ):
+	try:
+		shm = shared_memory.SharedMemory( name = shared[0] )
+	except FileNotFoundError:
+		return
+	shm.close()
+	shm.unlink()
+
+def _build( spec ):
+	cls, args, kwargs = spec
+	t = time.perf_counter()
+	shape = cls( *args, **kwargs )
+	arrays = shape.arrays()
+	seconds = time.perf_counter() - t
+	return shape.name, { key: _share(array) for key, array in arrays.items() }, seconds
+
+def build( specs, processes = None, use_cache = False ):
+	"""
+		builds all the specs concurrently
+
+		returns a list of ( Polytope, seconds ), in the order of specs, where
+		seconds is the time it took a worker to build and evaluate the shape ;
+		with use_cache, shapes found in the disk cache (see cache.py) are not
+		built again and take 0 seconds
+	"""
+	built = [ ( cache.load( *s ), 0. ) if use_cache else ( None, 0. ) for s in specs ]
+	missing = [ i for i, ( shape, _ ) in enumerate(built) if shape is None ]
+	if not missing:
+		return built
+
+	pool = Pool( processes )
+	pending = { i: pool.apply_async( _build, ( specs[i], ) ) for i in missing }
+	try:
+		for i in missing:
+			name, shared, seconds = pending[i].get()
+			del pending[i]
+			shape = Polytope.from_dict( { key: _attach(s) for key, s in shared.items() }, name = name )
+			if use_cache:
+				cache.store( shape, *specs[i] )
+			built[i] = ( shape, seconds )
+	finally:
+		# if a spec failed, the other workers still hand their segments over:
+		# wait for them and unlink what was not attached
+		pool.close()
+		pool.join()
+		for result in pending.values():
+			if result.successful():
+				for s in result.get()[1].values():
+					_discard( s )
+	return built
+
+def report( built, wall = None ):
+	for shape, seconds in built:
+		print(f"{seconds:9.3f}s  {shape}")
+	if wall is not None:
+		print(f"{wall:9.3f}s  total (wall clock), {sum( s for _, s in built ):.3f}s of work")
+
+
+if __name__ == '__main__':
+	from sys import argv
+	from primitives import Spiral
+	from platonic import Cube, Dodecahedron
+
+	n = int(argv[1]) if len(argv) > 1 and argv[1].isdigit() else 1000000
+	specs = [ spec( Spiral, n, ('Logarithmic', {'a':2, 'k':k/10}) ) for k in range(1,9) ] + [
+			spec( Spiral, n, ('Archimedean', {'a':2}) ),
+			spec( Spiral, n, ('Fermat', {'a':2}) ),
+			spec( Cube ),
+			spec( Dodecahedron ),
+		]
+	t = time.perf_counter()
+	built = build( specs, use_cache = '--cache' in argv )
+	report( built, time.perf_counter()-t )
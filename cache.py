@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	on-disk cache of built shapes
+
+	a shape is identified by its spec ( cls, args, kwargs ) (see build.spec) and
+	the source of the library (primitives, spirals and the module of cls), so
+	editing any of them is enough to invalidate what was cached.
+
+	every entry is a directory of .npy files (quats, edges, faces and the
+	attribute columns) that are memory-mapped when loaded, so a warm start
+	costs about the same whatever the size of the shape. The least recently
+	used entries are removed once the cache grows over CACHE_SIZE bytes.
+
+	usage, in a slice script:
+		from cache import cached
+		shapes = [ cached( Spiral, 1000000, ('Logarithmic', {'a':2, 'k':5}) ) ]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+from primitives import Polytope
+
+CACHE_DIR = os.environ.get( 'SUPERSLICE_CACHE', os.path.join( os.path.expanduser('~'), '.cache', 'superslice' ) )
+CACHE_SIZE = 4<<30	# bytes
+LIBRARY = ( 'primitives', 'spirals' )
+
+_sources = {}	# { ( path, mtime, size ): hash of the source }, per process
+
+def _source_hash( module_name ):
+	path = getattr( sys.modules.get( module_name ), '__file__', None )
+	if path is None:
+		return None
+	try:
+		stat = os.stat( path )
+	except OSError:
+		return None
+	# edited files (ie. a slice script that the GUI reloads) are hashed again
+	version = ( path, stat.st_mtime_ns, stat.st_size )
+	if version not in _sources:
+		with open( path, 'rb' ) as fh:
+			_sources[version] = hashlib.sha256( fh.read() ).hexdigest()
+	return _sources[version]
+
+def _canonical( value ):
+	"""
+		a stable, hashable description of value ; raises TypeError for
+		anything that has no such description (ie. lambdas, instances)
+	"""
+	if value is None or isinstance(value, (bool, int, float, str)):
+		return value
+	if isinstance(value, (tuple, list)):
+		return [ _canonical(v) for v in value ]
+	if isinstance(value, dict):
+		return sorted( ( str(k), _canonical(v) ) for k, v in value.items() )
+	if isinstance(value, np.ndarray):
+		return [ value.dtype.str, value.shape, hashlib.sha256( np.ascontiguousarray(value).tobytes() ).hexdigest() ]
+	if isinstance(value, np.generic):
+		return value.item()
+	qualname = getattr( value, '__qualname__', '' )
+	if callable(value) and qualname and '<' not in qualname:
+		# functions and classes are known by name (np.linspace, Spiral...) and
+		# by the source of their module, so that editing them is noticed
+		module = getattr( value, '__module__', None )
+		return [ module, qualname, _source_hash( module ) ]
+	raise TypeError( f"{value!r} can not be part of a cache key" )
+
+def key( cls, args = (), kwargs = {} ):
+	"""
+		the hex digest identifying a spec, or None if it can not be cached
+	"""
+	try:
+		description = _canonical([ cls, args, kwargs ])
+	except TypeError:
+		return None
+	sources = [ _source_hash( name ) for name in sorted( set( LIBRARY ) | { cls.__module__ } ) ]
+	return hashlib.sha256( json.dumps([ description, sources ]).encode() ).hexdigest()
+
+def load( cls, args = (), kwargs = {}, directory = None ):
+	"""
+		the cached Polytope for this spec, or None
+	"""
+	k = key( cls, args, kwargs )
+	if k is None:
+		return None
+	path = os.path.join( directory or CACHE_DIR, k )
+	try:
+		with open( os.path.join( path, 'meta.json' ) ) as fh:
+			meta = json.load( fh )
+		# copy-on-write: the shape may still be modified, the cache never is
+		arrays = { name: np.load( os.path.join( path, name+'.npy' ), mmap_mode = 'c' ) for name in meta['arrays'] }
+		os.utime( path )	# most recently used
+	except (OSError, ValueError, KeyError):
+		return None
+	return Polytope.from_dict( arrays, name = meta['name'] )
+
+def store( shape, cls, args = (), kwargs = {}, directory = None, size = None ):
+	"""
+		caches the arrays of `shape`, which was built from this spec ; returns
+		False if the spec can not be cached
+	"""
+	k = key( cls, args, kwargs )
+	if k is None:
+		return False
+	directory = directory or CACHE_DIR
+	os.makedirs( directory, exist_ok = True )
+	arrays = shape.arrays()
+	# written aside and renamed, so that a reader never sees half an entry
+	tmp = tempfile.mkdtemp( dir = directory, prefix = '.tmp-' )
+	try:
+		for name, array in arrays.items():
+			np.save( os.path.join( tmp, name+'.npy' ), array )
+		with open( os.path.join( tmp, 'meta.json' ), 'w' ) as fh:
+			json.dump( { 'name': shape.name, 'arrays': list(arrays) }, fh )
+		os.rename( tmp, os.path.join( directory, k ) )
+	except OSError:
+		# already cached by someone else, most likely
+		shutil.rmtree( tmp, ignore_errors = True )
+	evict( directory, CACHE_SIZE if size is None else size )
+	return True
+
+def evict( directory = None, size = CACHE_SIZE ):
+	"""
+		removes the least recently used entries until the cache fits in `size` bytes
+	"""
+	directory = directory or CACHE_DIR
+	entries = []
+	for entry in os.scandir( directory ):
+		if not entry.is_dir() or entry.name.startswith('.'):
+			continue
+		nbytes = sum( f.stat().st_size for f in os.scandir( entry.path ) )
+		entries.append(( entry.stat().st_mtime, nbytes, entry.path ))
+	total = sum( nbytes for _, nbytes, _ in entries )
+	for mtime, nbytes, path in sorted( entries ):
+		if total <= size:
+			break
+		shutil.rmtree( path, ignore_errors = True )
+		total -= nbytes
+
+def cached( cls, *args, **kwargs ):
+	"""
+		cls( *args, **kwargs ), loaded from the cache if it was built before
+
+		what comes from the cache is a plain Polytope (see Polytope.from_arrays),
+		not an instance of cls
+	"""
+	shape = load( cls, args, kwargs )
+	if shape is None:
+		shape = cls( *args, **kwargs )
+		store( shape, cls, args, kwargs )
+	return shape
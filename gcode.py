@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	streaming G-code backend
+
+	vertices are read from the shape one chunk at a time (see Polytope.chunks())
+	and every chunk is formatted in a single `%` operation, so memory stays
+	bounded regardless of the length of the toolpath.
+
+	the vertices are visited in order: a move to vertex i is a G1 (work move)
+	if an edge joins it to vertex i-1, a G0 (travel move) otherwise. every
+	other edge (see Polytope.extra_edges) is drawn afterwards, as a G0 to one
+	end and a G1 to the other (there is no path ordering yet)
+"""
+
+import numpy as np
+from primitives import norm, quats_xyz
+
+HEADER = """; generated by superslice
+G21 ; millimeters
+G90 ; absolute positions
+"""
+FOOTER = """M400 ; wait for moves to finish
+"""
+
+def _templates( precision, extrude ):
+	"""
+		line templates indexed by ( work << 2 | with_e << 1 | with_f )
+	"""
+	xyz = f" X%.{precision}f Y%.{precision}f Z%.{precision}f"
+	e = f" E%.{max(precision,5)}f"
+	templates = []
+	for code in range(8):
+		work, with_e, with_f = code >> 2, code >> 1 & 1, code & 1
+		templates.append( ( "G1" if work else "G0" ) + xyz + ( e if with_e else "" ) + ( " F%.0f" if with_f else "" ) + "\n" )
+	return templates
+
+def _positions( shape, index, chunk ):
+	"""
+		(len(index),3) cartesian coordinates of vertices `index`, evaluated a
+		window of `chunk` vertices at a time
+	"""
+	xyz = np.empty( ( len(index), 3 ) )
+	window = index // chunk
+	for w in np.unique( window ).tolist():
+		which = window == w
+		comps = shape.window( w*chunk, min( (w+1)*chunk, shape.len ) )
+		xyz[which] = quats_xyz( comps[ index[which] - w*chunk ] )
+	return xyz
+
+def write( shape, out, *, chunk = 1<<16, feed = 1200, travel_feed = 6000, extrude = None, precision = 3, header = HEADER, footer = FOOTER ):
+	"""
+		writes the toolpath of `shape` as G-code
+
+		shape: a Polytope (anything with len, chunks(), window(), linked() and
+			extra_edges())
+		out: a file name or a writable text file (or pipe)
+		chunk: how many vertices are formatted at once
+		feed, travel_feed: default feed rates (mm/min) of G1 and G0 moves ; a
+			finite 'feed' attribute on a vertex overrides `feed` for the move to it
+		extrude: filament length per mm of path ; None for no E axis (ie. for
+			a mill or a laser) ; a finite 'extrusion' attribute on a vertex
+			overrides it for the move to it. E is relative (M83)
+
+		returns the number of moves written ; raises ValueError at the first
+		vertex whose position is not finite (NaN or inf)
+	"""
+	if isinstance(out, str):
+		with open( out, 'w' ) as fh:
+			return write( shape, fh, chunk = chunk, feed = feed, travel_feed = travel_feed,
+					extrude = extrude, precision = precision, header = header, footer = footer )
+
+	templates = _templates( precision, extrude is not None )
+	store = getattr( shape, 'store', None )
+	if store is not None and len(store) != shape.len:
+		store = None	# ie. a LazySpiral has no per-vertex attributes
+
+	out.write( header )
+	if extrude is not None:
+		out.write( "M83 ; relative extrusion\n" )
+
+	last_xyz = None
+	last_f = np.nan
+	moves = 0
+
+	def emit( index, xyz, work ):
+		""" writes the moves to vertices `index`, at `xyz` ; G1 where work is True """
+		nonlocal last_xyz, last_f, moves
+		bad = ~np.isfinite( xyz ).all( axis = 1 )
+		if bad.any():
+			raise ValueError( f"vertex {index[ np.argmax(bad) ]} is not a finite position: {xyz[ np.argmax(bad) ]}" )
+		xyz = np.round( xyz, precision ) + 0.	# no "-0.000"
+
+		# feed rate of each move, only written when it changes (F is modal)
+		f = np.where( work, feed, travel_feed ).astype(float)
+		if store is not None:
+			vf = store.attrs['feed'][index]
+			f = np.where( work & np.isfinite(vf), vf, f )
+		with_f = f != np.concatenate(( [last_f], f[:-1] ))
+		last_f = f[-1]
+
+		columns = [ xyz ]
+		keep = [ np.ones( xyz.shape, dtype = bool ) ]
+		with_e = np.zeros( len(xyz), dtype = bool )
+		if extrude is not None:
+			previous = np.concatenate(( [xyz[0] if last_xyz is None else last_xyz], xyz[:-1] ))
+			ratio = np.full( len(xyz), extrude, dtype = float )
+			if store is not None:
+				ve = store.attrs['extrusion'][index]
+				ratio = np.where( np.isfinite(ve), ve, ratio )
+			columns.append( ( norm( xyz - previous )*ratio )[:,None] )
+			with_e = work
+			keep.append( with_e[:,None] )
+		columns.append( f[:,None] )
+		keep.append( with_f[:,None] )
+		last_xyz = xyz[-1]
+
+		# one template per line, then a single format of all the values that are kept
+		values = np.concatenate( columns, axis = 1 )[ np.concatenate( keep, axis = 1 ) ]
+		codes = work.astype(int) << 2 | with_e.astype(int) << 1 | with_f.astype(int)
+		runs = np.flatnonzero( np.diff( codes ) ) + 1
+		starts = np.concatenate(( [0], runs )).tolist()
+		ends = np.concatenate(( runs, [len(codes)] )).tolist()
+		fmt = ''.join([ templates[c]*(b-a) for c, a, b in zip( codes[starts].tolist(), starts, ends ) ])
+		out.write( fmt % tuple( values.tolist() ) )
+		moves += len(xyz)
+
+	# the path along the vertices, in order
+	for start, comps in shape.chunks( chunk ):
+		stop = start + len(comps)
+		emit( np.arange( start, stop ), quats_xyz( comps ), shape.linked( start, stop ) )
+
+	# then every other edge, as a travel to its start and a work move to its
+	# end ; the travel is left out when the previous edge ended there
+	extra = shape.extra_edges()
+	last = shape.len-1	# where the path ended
+	for first in range( 0, len(extra), chunk ):
+		a, b = extra[first:first+chunk].T
+		index = np.stack( ( a, b ), axis = -1 ).ravel()
+		work = np.tile( [ False, True ], len(a) )
+		keep = work | ( index != np.concatenate(( [last], index[:-1] )) )
+		last = index[-1]
+		index, work = index[keep], work[keep]
+		emit( index, _positions( shape, index, chunk ), work )
+
+	out.write( footer )
+	return moves
@@ -17,12 +17,16 @@ LINE_RENDERING_CORRECT = False
 import numpy as np
 
 from vispy import scene, app
+from vispy.gloo import IndexBuffer
 from vispy.geometry import meshdata as MeshData
 from vispy.scene.visuals import Mesh, MeshNormals
 from vispy.visuals.filters import WireframeFilter
-from vispy.color.colormap import get_colormaps
+from vispy.color.colormap import get_colormaps, get_colormap
 
 from sys import exit as sysexit
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from traceback import print_exc
 
 
 try:
@@ -54,6 +58,7 @@ style_h1 = "QLabel {font-weight: bold;}"
 style_TODO = "QLabel {font-style: italic; color: #c0c0c0}"
 
 import superslice
+from watcher import Watcher, tracked_modules, reload_modules
 
 class ObjectWidget(QWidget):
 	"""
@@ -376,6 +381,8 @@ class ObjectWidget(QWidget):
 		self.signal_object_changed.emit()
 	
 class MainWindow(QMainWindow):
+	# emitted from the watcher thread, received in the GUI thread
+	signal_changed = pyqtsignal(name='changed')
 
 	def __init__(self):
 		QMainWindow.__init__(self)
@@ -386,7 +393,7 @@ class MainWindow(QMainWindow):
 
 		splitter = QSplitter(Qt.Horizontal)
 
-		self.canvas = Canvas()
+		self.canvas = Canvas( ss.shapes[0] )
 		self.canvas.create_native()
 		self.canvas.native.setParent(self)
 
@@ -399,9 +406,14 @@ class MainWindow(QMainWindow):
 
 		self.setCentralWidget(splitter)
 		self.props.signal_object_changed.connect(self.update_view)
+		self.loader = Loader( self )
+		self.loader.signal_loaded.connect(self.set_geometry)
+		self.set_layers()
 		self.update_view()
 
-		self.timer = app.Timer(1, connect=self.on_timer, start=True)
+		# reload as soon as the script or a module it uses is saved
+		self.signal_changed.connect(self.reload_slice)
+		self.watcher = Watcher( [ slice_file ] + tracked_files(), self.signal_changed.emit )
 
 		@self.canvas.events.key_press.connect
 		def on_key_press(event):
@@ -433,46 +445,152 @@ class MainWindow(QMainWindow):
 			)
 
 	def reload_slice(self):
-		from importlib import reload
-		reload(superslice)
-		reload(ss)
-		self.canvas.P = ss.shapes[0]
-		self.canvas.points = self.canvas.P.get_points()
-		self.props.paths_start_layer_z.setMaximum(self.canvas.P.totallayers)
-		self.props.paths_stop_layer_z.setMaximum(self.canvas.P.totallayers)
-		self.props.faces_start_layer_z.setMaximum(self.canvas.P.totallayers-1)
-		self.props.faces_stop_layer_z.setMaximum(self.canvas.P.totallayers-1)
+		""" the GUI stays responsive, set_geometry() is called when the shape is ready """
+		self.loader.request( self.canvas.cmap )
+
+	def set_geometry(self, geometry):
+		self.canvas.set_geometry( geometry )
+		self.set_layers()
 		self.update_view()
+		# the script may import other modules now
+		self.watcher.watch( [ slice_file ] + tracked_files() )
 
-	def on_timer(self, event):
-		''' checks file for modifications and reload source script '''
-		import os.path
-		global slice_file
-	
-		print("ping")
-	
+	def set_layers(self):
+		""" layer clipping spinboxes follow the number of layers of the shape """
+		top = max( self.canvas.layers.count-1, 0 )
+		for spinbox in ( self.props.paths_start_layer_z, self.props.paths_stop_layer_z, self.props.faces_start_layer_z, self.props.faces_stop_layer_z ):
+			spinbox.setMaximum( top )
+		self.props.paths_stop_layer_z.setValue( top )
+		self.props.faces_stop_layer_z.setValue( top )
+
+
+def tracked_files():
+	return [ module.__file__ for module in tracked_modules(ss) ]
+
+Geometry = namedtuple( 'Geometry', ( 'shape', 'cmap', 'points', 'colors', 'layers', 'edges', 'triangles', 'instances' ) )
+
+class Loader(QtCore.QObject):
+	"""
+		reloads the slice script and prepares its geometry in a worker thread
+
+		every request gets a ticket and only the geometry of the latest one is
+		handed back (with a signal, so it is received in the GUI thread) ;
+		requests that are superseded before they start are skipped, those that
+		are already running are dropped when they finish
+	"""
+	signal_loaded = pyqtsignal(object, name='loaded')
+
+	def __init__(self, parent=None):
+		super(Loader, self).__init__(parent)
+		self.executor = ThreadPoolExecutor( max_workers = 1 )
+		self.ticket = 0
+
+	def request(self, cmap):
+		self.ticket += 1
+		self.executor.submit( self._load, self.ticket, cmap )
+
+	def _load(self, ticket, cmap):
+		if ticket != self.ticket:
+			return
 		try:
-			if os.path.getmtime(slice_file) > self.slice_mtime:
-				self.reload_slice()
-		except AttributeError:
-			# first run at startup ; not a big deal, it prevents having to import os.path somewhere else and have duplicate code
-			print("first run, setting slice_mtime ; we don't need to reload module anyway because we just loaded it (another reason to not set slice_mtime before)")
-			pass
-		except FileNotFoundError:
-			# file is probably being rewritten right now.. we simply wait until the next iteration
-			print("waiting for file to become available")
-			pass
-		finally:
-			try:
-				self.slice_mtime = os.path.getmtime(slice_file)
-			except FileNotFoundError:
-				# file is probably still being rewritten
-				print("still waiting for file to become available")
-				pass
+			reload_modules( tracked_modules(ss) )
+			geometry = Canvas.prepare( ss.shapes[0], cmap )
+		except Exception:
+			# most likely the script is being edited ; wait for the next change
+			print_exc()
+			return
+		if ticket == self.ticket:
+			self.signal_loaded.emit( geometry )
+
+class Paths:
+	"""
+		the toolpath of a shape, drawn as a single Line visual
+
+		vertex positions and colors are uploaded once, in one buffer each ; what
+		is drawn is selected with the `connect` index array, so that showing
+		another set of edges only uploads a new (small) index buffer.
+
+		with LINE_RENDERING_CORRECT each edge gets two vertices of its own, so
+		that it has a single color instead of a gradient between its ends
+	"""
+	def __init__(self, parent):
+		self.line = scene.visuals.Line( method = 'gl', parent = parent )
+		self.segments = np.empty( (0,2), dtype = np.uint32 )
+		self.shown = None
+
+	def set_shape(self, xyz, colors, edges):
+		if LINE_RENDERING_CORRECT:
+			xyz = xyz[edges].reshape(-1,3)
+			colors = np.repeat( colors[edges[:,0]], 2, axis = 0 )
+			self.segments = np.arange( 2*len(edges), dtype = np.uint32 ).reshape(-1,2)
+		else:
+			self.segments = edges.astype( np.uint32 )
+		self.edges = edges
+		self.shown = slice(None)
+		self.line.set_data( pos = xyz.astype( np.float32 ), color = colors, connect = self.segments )
+		self.line.visible = len(self.segments) > 0
+
+	def set_colors(self, colors):
+		if LINE_RENDERING_CORRECT:
+			colors = np.repeat( colors[self.edges[:,0]], 2, axis = 0 )
+		self.line.set_data( color = colors )
+
+	def show(self, edges = slice(None)):
+		"""
+			edges: index (or slice) of the edges to draw
+		"""
+		connect = self.segments[edges]
+		self.line.visible = len(connect) > 0
+		if len(connect):
+			self.line.set_data( connect = connect )
+		self.shown = edges
+
+class Faces:
+	"""
+		the faces of a shape, drawn as a single Mesh visual
+
+		the mesh is uploaded once, with its triangles sorted by layer ; vispy
+		expands it to three vertices per triangle, in that order, so that the
+		triangles of a range of layers are a range of the vertex buffer, drawn
+		through a new (small) index buffer without touching the geometry
+	"""
+	def __init__(self, parent):
+		self.mesh = scene.visuals.Mesh( parent = parent )
+		self.count = 0
 
+	def set_shape(self, xyz, triangles):
+		self.count = len(triangles)
+		self.mesh._index_buffer = None
+		self.mesh.set_data( vertices = xyz, faces = triangles )
+		self.mesh.visible = self.count > 0
+
+	def show(self, triangles = slice(None)):
+		"""
+			triangles: slice of the triangles to draw
+		"""
+		start, stop, _ = triangles.indices( self.count )
+		self.mesh.visible = stop > start
+		if stop - start == self.count:
+			self.mesh._index_buffer = None
+		elif stop > start:
+			self.mesh._index_buffer = IndexBuffer( np.arange( 3*start, 3*stop, dtype = np.uint32 ) )
+		self.mesh.update()
+
+def vertex_colors( shape, cmap ):
+	"""
+		(N,4) float32 : the 'color' of each vertex where it is set, the color
+		map along the path everywhere else
+	"""
+	colors = get_colormap( cmap ).map( np.linspace( 0, 1, shape.len )[:,None] ).astype( np.float32 )
+	own = shape.store.attrs['color']
+	if len(own) != shape.len:
+		return colors	# ie. Instances have no per-vertex attributes
+	isset = np.isfinite( own ).all( axis = 1 )
+	colors[isset] = own[isset]
+	return colors
 
 class Canvas(scene.SceneCanvas):
-	def __init__(self):
+	def __init__(self, P):
 
 		scene.SceneCanvas.__init__(self, keys=None)
 		self.size = 800, 600
@@ -480,40 +598,12 @@ class Canvas(scene.SceneCanvas):
 		self.view = self.central_widget.add_view()
 		self.view.camera = 'turntable'
 
-		#self.points = []
-		#for shape in ss.shapes:
-		#	self.points.extend([p.xyz for p in shape.vertices])
-		#	faces = shape.faces
-		#	#self.P = ss.shapes[0]
-		#	#self.points = self.P.get_points()	# ALL the points, required for the mesh
-		#	#faces = self.P.get_mesh()
-		#	#points = self.P.get_points()
-		from vispy.geometry.generation import create_sphere
-		mesh = create_sphere(20, 20, radius=2.0)
-		self.points = mesh.get_vertices()
-		faces = mesh.get_faces()
-
 		"""
 		this is the actual path data (the path the toolhead will follow)
 		for now we consider the tool orientation is always "normal" to the zero-plane
 		(ie. the build surface) but this is likely to change in the future
 		"""
-		
-		if not LINE_RENDERING_CORRECT:
-			# simpler version, but it's the points that get the shade! -> wrong
-			print(self.points[1])
-			#TODO self.line = scene.visuals.Line(pos=self.points[0], color=self.points[1], parent=self.view.scene)
-			self.line = scene.visuals.Line(pos=self.points, parent=self.view.scene)
-
-		else:
-			# correct rendering version, but WAAAAY too slow! uses huge amount of CPU
-			#connect='segments'
-			#This generates an A->B, B->C, C->D series of segments
-			segs, cols = self.P.get_segments_by_layer()
-			self.lines = []
-			for i in range(len(segs)):
-				#TODO self.lines.append( scene.visuals.Line(pos=segs[i], color=cols[i], parent=self.view.scene) )
-				self.lines.append( scene.visuals.Line(pos=segs[i], parent=self.view.scene) )
+		self.paths = Paths( self.view.scene )
 
 		"""
 		this shows a solid that approximates the final solid as it would be printed
@@ -522,27 +612,28 @@ class Canvas(scene.SceneCanvas):
 		have _never_ done that kind of work, I barely know what it's for so
 		some guidance would be really appreciated : static shading prevents from having a good view!
 		"""
-		#print(len(faces[0]))
-		#print(len(faces[1]))
-		#print(faces[1])
-		meshdata = MeshData.MeshData(
-				vertices=self.points[0],
-				faces=faces[0],
-				#face_colors = faces[1],
-			)
-		#self.mesh = scene.visuals.Mesh(
-		#		meshdata=meshdata,
-		#		parent=self.view.scene)
+		self.faces = Faces( self.view.scene )
+
+		"""
+		the faces of Instances are drawn from their base and one transform per
+		instance, as long as they are not clipped
+		"""
+		self.instanced = scene.visuals.InstancedMesh( instance_positions = np.zeros((1,3)),
+				instance_transforms = np.eye(3)[None], parent = self.view.scene )
+		self.instanced.visible = False
+
+		self.cmap = 'viridis'
+		self.set_shape( P )
 
 		# Wireframe for mesh
 		#wireframe_filter = WireframeFilter(color='lightblue')
-		#self.mesh.attach(wireframe_filter)
+		#self.faces.mesh.attach(wireframe_filter)
 
 		#self.face_normals = MeshNormals(meshdata, primitive='face', color='yellow')
-		#self.face_normals.parent = self.mesh
+		#self.face_normals.parent = self.faces.mesh
 		#self.face_normals.visible = False
 		#self.vertex_normals = MeshNormals(meshdata, primitive='vertex', color='orange', width=2)
-		#self.vertex_normals.parent = self.mesh
+		#self.vertex_normals.parent = self.faces.mesh
 		#self.vertex_normals.visible = False
 
 		self.freeze()
@@ -550,6 +641,46 @@ class Canvas(scene.SceneCanvas):
 		# Add a 3D axis to keep us oriented
 		#scene.visuals.XYZAxis(parent=self.view.scene)
 
+	@staticmethod
+	def prepare(P, cmap):
+		"""
+			computes everything set_geometry() uploads ; this does not touch the
+			canvas, so it can run in a worker thread
+
+			edges and triangles are sorted by layer (see Polytope.layers), so
+			that layer clipping is only a matter of drawing a slice of them
+		"""
+		layers = P.layers()
+		instances = None
+		frames = P.frames() if hasattr( P, 'frames' ) else None
+		if frames is not None and len( P.base.triangles() ):
+			instances = ( P.base.xyz(), P.base.triangles(), *frames )
+		return Geometry( P, cmap, P.xyz(), vertex_colors( P, cmap ), layers,
+				P.edge_array[layers.edge_order], P.triangles()[layers.triangle_order], instances )
+
+	def set_shape(self, P):
+		"""
+			uploads the geometry of shape P
+		"""
+		self.set_geometry( self.prepare( P, self.cmap ) )
+
+	def set_geometry(self, g):
+		self.P, self.cmap, self.points, self.layers = g.shape, g.cmap, g.points, g.layers
+		self.paths.set_shape( g.points, g.colors, g.edges )
+		self.faces.set_shape( g.points, g.triangles )
+		self.instances = g.instances
+		if g.instances is not None:
+			vertices, faces, positions, matrices = g.instances
+			self.instanced.set_data( vertices = vertices, faces = faces )
+			self.instanced.instance_positions = positions
+			self.instanced.instance_transforms = matrices
+		self.instanced.visible = False
+		self.clip = None
+
+	def layer_slice(self, offsets, start, stop):
+		""" the slice of what is in layers start..stop (included) """
+		stop = min( stop, len(offsets)-2 )
+		return slice( offsets[start], offsets[stop+1] ) if start <= stop else slice(0,0)
 
 	def set_data(self, clip, cmap, fov, shading, normals):
 		""" TODO
@@ -566,52 +697,25 @@ class Canvas(scene.SceneCanvas):
 				self.vertex_normals.visible = True
 				self.face_normals.visible = True
 		"""
-		#if not LINE_RENDERING_CORRECT:
-		#	# TODO check if a value was changed, only update that!
-		#	self.P.layer_start, self.P.layer_stop = clip[0], clip[1]
-		#	try:
-		#		points = self.P.get_points()
-		#		print("points/colors (vispy)", len(points[0]), len(points[1]))
-		#		self.line.set_data( pos = points[0], color = points[1] )
-		#		self.line.parent = self.view.scene
-		#	except superslice.NothingToShow:
-		#		self.line.parent = None
-		#else:
-		#	self.P.layer_start, self.P.layer_stop = clip[0], clip[1]
-		#	for l in self.lines:
-		#		l.parent = None
-		#		del l
-		#	try:
-		#		segs, cols = self.P.get_segments_by_layer()
-		#		for i in range(len(segs)):
-		#			self.lines.append( scene.visuals.Line(pos=segs[i], color=cols[i], parent=self.view.scene) )
-		#	except superslice.NothingToShow:
-		#		pass
-
-		# TODO check if a value was changed, only update that!
-		#TODO self.P.layer_start_faces, self.P.layer_stop_faces = clip[2], clip[3]
-		try:
-			faces, colors = self.P.get_mesh()
-			#print("face/colors (vispy)", len(faces), len(colors))
-			meshdata = MeshData.MeshData(
-					vertices=self.points[0],
-					faces=faces,
-					edges=None,
-					face_colors = colors,
-				)
-			#self.mesh.set_data( meshdata = meshdata )
-			#self.mesh.parent = self.view.scene
-
-			#TODO self.face_normals.set_data(meshdata = meshdata)
-			#TODO self.vertex_normals.set_data(meshdata = meshdata)
-		except: #TODO superslice.NothingToShow:
-			#self.mesh.parent = None
-			#TODO self.face_normals.parent = None
-			#TODO self.vertex_normals.parent = None
-			pass
+		if cmap != self.cmap:
+			self.cmap = cmap
+			self.paths.set_colors( vertex_colors( self.P, cmap ) )
+
+		# layer clipping only slices what was uploaded by set_shape()
+		if self.clip is None or clip[:2] != self.clip[:2]:
+			self.paths.show( self.layer_slice( self.layers.edge_offsets, clip[0], clip[1] ) )
+		if self.clip is None or clip[2:] != self.clip[2:]:
+			whole = clip[2] <= 0 and clip[3] >= self.layers.count-1
+			self.instanced.visible = self.instances is not None and whole
+			self.faces.show( self.layer_slice( self.layers.triangle_offsets, clip[2], clip[3] ) )
+			if self.instanced.visible:
+				self.faces.mesh.visible = False
+			#TODO self.face_normals.set_data(meshdata = self.faces.mesh.mesh_data)
+			#TODO self.vertex_normals.set_data(meshdata = self.faces.mesh.mesh_data)
+		self.clip = clip
 
 		self.view.camera.fov = fov
-		#self.mesh.shading = shading
+		#self.faces.mesh.shading = shading
 
 		#self.iso.set_color(cmap)
 		# maybe it's faster to only hide some trianglesvrather than recompute, ie. with clipping planes? I'm not quite I understood the related example, though.
@@ -623,31 +727,6 @@ class Canvas(scene.SceneCanvas):
 		#self.iso.tris = faces
 		#self.iso.levels = face_colors
         
-def on_timer(event):
-	''' checks file for modifications and reload source script '''
-	import os.path
-	global slice_file, slice_mtime
-
-	try:
-		if os.path.getmtime(slice_file) > slice_mtime:
-			app.reload_slice()
-	except NameError:
-		# first run at startup
-		pass
-	except FileNotFoundError:
-		# file is probably being rewritten right now..
-		pass
-	finally:
-		try:
-			slice_mtime = os.path.getmtime(slice_file)
-		except FileNotFoundError:
-			# file is probably still being rewritten
-			pass
-
-
-
-#timer = app.Timer(1, connect=on_timer, start=True)
-
 if __name__ == '__main__':
 	from sys import argv
 
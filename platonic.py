@@ -3,7 +3,8 @@
 # vim: noet ts=4 ai number
 
 import numpy as np
-from primitives import Quat, Point, Polytope
+import quaternion
+from primitives import Quat, Point, Polytope, VertexStore
 phi = (1 + pow(5,1/2))/2 # golden ratio
 qi = np.pi/2
 
@@ -68,31 +69,35 @@ class Cube(Polyhedron):
 	num_vertices = 8
 	num_edges = 12
 	num_faces = 6
+
+	# cartesian coordinates on a sphere of radius 3**(1/2) ; the top square,
+	# counterclockwise seen from above, then the bottom one
+	cartesian = np.array([
+		(-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1),
+		(-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1),
+	])
 		
 	def __init__( self, r = 1, *args, **kwargs ):
 		# TODO bounds ; we want to be able to draw a partial cube
-		vertices = np.array([Point( self, quat = Quat.new_polar( r, delta*qi/2, echo*qi/2 )) for delta in (-2,-1,1,2) for echo in (-1,1)])
+		x, y, z = self.cartesian.T
+		vertices = VertexStore.from_quats( quaternion.as_float_array( Quat.polar_array(
+				r, np.arctan2(y, x), -np.arctan2(z, np.hypot(x, y)) ) ) )
 
-		edges = []
-		for edge in [
-		    (0, 1), (1, 2), (2, 3), (3, 0),  # top square
-		    (0, 4), (1, 5), (2, 6), (3, 7),  # vertical edges
-		    (4, 5), (5, 6), (6, 7), (7, 4),  # bottom square
-		]:
-			edges.append((vertices[edge[0]], vertices[edge[1]]))
-			edges.append((vertices[edge[1]], vertices[edge[0]]))
-		
 		super().__init__( r,
 				vertices, 
-				edges = edges,
-				faces = [[ edges[face[0]], edges[face[1]], edges[face[2]], edges[face[3]] ] for face in [
-					(0,2,4,6),
-					(0,2,10,8),
-					(2,4,12,10),
-					(4,6,14,12),
-					(6,8,0,14),
-					(16,18,20,22),
-				]],
+				edges = np.array([
+					(0, 1), (1, 2), (2, 3), (3, 0),  # top square
+					(0, 4), (1, 5), (2, 6), (3, 7),  # vertical edges
+					(4, 5), (5, 6), (6, 7), (7, 4),  # bottom square
+				]),
+				faces = [	# counterclockwise seen from the outside
+					(0, 1, 2, 3),
+					(0, 4, 5, 1),
+					(1, 5, 6, 2),
+					(2, 6, 7, 3),
+					(3, 7, 4, 0),
+					(7, 6, 5, 4),
+				],
 				name = 'Cube',
 			*args, **kwargs )
 
@@ -118,55 +123,46 @@ class Dodecahedron(Polyhedron):
 	num_edges = 30
 	num_faces = 12
 
-	def __init__( self, *args, **kwargs ):
-		vertices = [ Point( self, quat = Quat.new_polar( p )) for p in [
-			(r, np.arctan2(1, phi), np.arccos(1/phi)), # Vertex 0
-			(r, np.arctan2(phi, 1), np.arccos(1/phi)), # Vertex 1
-			(r, np.arctan2(phi, -1), np.arccos(1/phi)), # Vertex 2
-			(r, np.arctan2(1, -phi), np.arccos(1/phi)), # Vertex 3
-			(r, np.arctan2(-1, -phi), np.arccos(1/phi)), # Vertex 4
-			(r, np.arctan2(-phi, -1), np.arccos(1/phi)), # Vertex 5
-			(r, np.arctan2(-phi, 1), np.arccos(1/phi)), # Vertex 6
-			(r, np.arctan2(-1, phi), np.arccos(1/phi)), # Vertex 7
-			(r, np.arctan2(0, 1), np.arccos(phi)), # Vertex 8
-			(r, np.arctan2(1, 0), np.arccos(phi)), # Vertex 9
-			(r, np.arctan2(0, -1), np.arccos(phi)), # Vertex 10
-			(r, np.arctan2(-1, 0), np.arccos(phi)), # Vertex 11
-			(r, np.arctan2(1/phi, phi), np.arccos(phi)), # Vertex 12
-			(r, np.arctan2(phi, 1/phi), np.arccos(phi)), # Vertex 13
-			(r, np.arctan2(-phi, 1/phi), np.arccos(phi)), # Vertex 14
-			(r, np.arctan2(-1/phi, phi), np.arccos(phi)), # Vertex 15
-			(r, np.arctan2(1/phi, -phi), np.arccos(phi)), # Vertex 16
-			(r, np.arctan2(-1/phi, -phi), np.arccos(phi)), # Vertex 17
-			(r, np.arctan2(-phi, -1/phi), np.arccos(phi)), # Vertex 18
-			(r, np.arctan2(phi, -1/phi), np.arccos(phi)), # Vertex 19
-		]]
+	# cartesian coordinates on a sphere of radius 3**(1/2), top to bottom
+	cartesian = np.array([
+		(0, -1/phi, phi), (0, 1/phi, phi),
+		(-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1),
+		(phi, 0, 1/phi), (-phi, 0, 1/phi),
+		(-1/phi, -phi, 0), (1/phi, -phi, 0), (1/phi, phi, 0), (-1/phi, phi, 0),
+		(phi, 0, -1/phi), (-phi, 0, -1/phi),
+		(-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1),
+		(0, -1/phi, -phi), (0, 1/phi, -phi),
+	])
 
-		edges = []
-		for edge in [
-			(0, 1), (0, 7), (0, 9), (1, 2), (1, 12),
-			(2, 3), (2, 14), (3, 4), (3, 16), (4, 5),
-			(4, 18), (5, 6), (5, 19), (6, 7), (6, 13),
-			(7, 8), (8, 9), (8, 11), (9, 10), (10, 11),
-			(10, 17), (11, 15), (12, 13), (12, 14), (13, 15),
-			(14, 16), (15, 17), (16, 18), (17, 19), (18, 19)
-		]:
-			edges.append((vertices[edge[0]], vertices[edge[1]]))
-			edges.append((vertices[edge[1]], vertices[edge[0]]))
+	def __init__( self, r = 1, *args, **kwargs ):
+		x, y, z = self.cartesian.T
+		vertices = VertexStore.from_quats( quaternion.as_float_array( Quat.polar_array(
+				r, np.arctan2(y, x), -np.arctan2(z, np.hypot(x, y)) ) ) )
 
-		super().__init__( self,
+		super().__init__( r,
 				vertices, 
-				edges = edges,
-				faces = [ [ edges[face[0]], edges[face[1]], edges[face[2]], edges[face[3]], edges[face[4]] ] for face in [
-					(0, 2, 4, 6, 8),
-					(0, 14, 26, 16, 18),
-					(2, 24, 28, 4, 10),
-					(6, 32, 36, 8, 12),
-					(14, 12, 38, 30, 26),
-					(10, 38, 36, 32, 22),
-					(16, 22, 34, 20, 18),
-					(20, 34, 30, 28, 24)
-				]],
+				edges = np.array([
+					(0, 1), (0, 2), (0, 3), (1, 4), (1, 5),
+					(2, 7), (2, 8), (3, 6), (3, 9), (4, 6),
+					(4, 10), (5, 7), (5, 11), (6, 12), (7, 13),
+					(8, 9), (8, 14), (9, 15), (10, 11), (10, 16),
+					(11, 17), (12, 15), (12, 16), (13, 14), (13, 17),
+					(14, 18), (15, 18), (16, 19), (17, 19), (18, 19),
+				]),
+				faces = [	# counterclockwise seen from the outside
+					(0, 1, 5, 7, 2),
+					(0, 2, 8, 9, 3),
+					(0, 3, 6, 4, 1),
+					(1, 4, 10, 11, 5),
+					(2, 7, 13, 14, 8),
+					(3, 9, 15, 12, 6),
+					(4, 6, 12, 16, 10),
+					(5, 11, 17, 13, 7),
+					(8, 14, 18, 15, 9),
+					(10, 16, 19, 17, 11),
+					(12, 15, 18, 19, 16),
+					(13, 17, 19, 18, 14),
+				],
 				name = 'Dodecahedron',
 			*args, **kwargs )
 
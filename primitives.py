@@ -2,13 +2,235 @@
 # -*- coding: utf-8 -*-
 # vim: noet ts=4 ai number
 
+import operator
+from collections import namedtuple, OrderedDict
+from collections.abc import MutableMapping, Sequence
 import quaternion
 import numpy as np
 qi = np.pi/2
 
 def norm( vec ):
-	""" norm of a cartesian vector """
-	return pow( sum([pow(x,2) for x in vec]), 1/2 )
+	""" norm of a cartesian vector (or of each row of an array of vectors) """
+	return np.sqrt( np.sum( np.square(vec), axis = -1 ) )
+
+def quats_xyz( comps ):
+	"""
+		cartesian coordinates of an (N,4) array of quaternion components
+
+		a quaternion q = pow(norm,1/2)*rotation (see Quat.new_polar) is the point
+		at distance `norm` from the origin in the direction where the rotation
+		takes the x axis ; that is q*x*q.conjugate(), expanded so that no
+		normalisation is needed.
+	"""
+	w, x, y, z = np.moveaxis( comps, -1, 0 )
+	return np.stack( (
+			w*w + x*x - y*y - z*z,
+			2*(x*y + w*z),
+			2*(x*z - w*y),
+		), axis = -1 )
+
+def xyz_quats( xyz ):
+	"""
+		(N,4) quaternion components of the points at (N,3) cartesian coordinates,
+		with no roll (see quats_xyz)
+	"""
+	delta, echo, n = np.moveaxis( xyz_polar( xyz ), -1, 0 )
+	return quaternion.as_float_array( Quat.polar_array( n, delta, -echo ) )
+
+def xyz_polar( xyz ):
+	"""
+		(delta, echo, norm) of an (N,3) array of cartesian coordinates
+	"""
+	x, y, z = np.moveaxis( xyz, -1, 0 )
+	xy = np.hypot( x, y )
+	return np.stack( ( np.arctan2( y, x ), np.arctan2( z, xy ), np.hypot( xy, z ) ), axis = -1 )
+
+def _qmul( a, b ):
+	""" Hamilton product of (...,4) arrays of quaternion components """
+	a0, a1, a2, a3 = np.moveaxis( np.asarray(a), -1, 0 )
+	b0, b1, b2, b3 = np.moveaxis( np.asarray(b), -1, 0 )
+	return np.stack( (
+			a0*b0 - a1*b1 - a2*b2 - a3*b3,
+			a0*b1 + a1*b0 + a2*b3 - a3*b2,
+			a0*b2 - a1*b3 + a2*b0 + a3*b1,
+			a0*b3 + a1*b2 - a2*b1 + a3*b0,
+		), axis = -1 )
+
+def _arc( a, b ):
+	"""
+		(N,4) unit quaternions of the shortest rotations taking the directions
+		of the (N,3) vectors a to those of b
+	"""
+	a, b = np.broadcast_arrays( a, b )
+	w = norm(a)*norm(b) + np.sum( a*b, axis = -1 )
+	q = np.concatenate( ( w[...,None], np.cross( a, b ) ), axis = -1 )
+	length = norm(q)
+	opposite = length < 1e-12*np.maximum( norm(a)*norm(b), 1e-300 )
+	if opposite.any():
+		# half a turn around any axis normal to a
+		axis = np.cross( a[opposite], ( 1, 0, 0 ) )
+		weak = norm(axis) < 1e-6*norm(a[opposite])
+		axis[weak] = np.cross( a[opposite][weak], ( 0, 1, 0 ) )
+		q[opposite] = np.concatenate( ( np.zeros( ( len(axis), 1 ) ), axis ), axis = -1 )
+		length[opposite] = norm(axis)
+	return q/np.maximum( length, 1e-300 )[...,None]
+
+def _frame( xyz ):
+	"""
+		(N,4) quaternions of the points at xyz, with no roll: the shortest
+		rotation from the x axis, scaled (see quats_xyz)
+	"""
+	return np.sqrt( norm(xyz) )[...,None]*_arc( ( 1, 0, 0 ), xyz )
+
+def _move( comps, old, new ):
+	"""
+		quaternions that were at `old` (N,3), moved to `new` ; the orientation
+		follows the shortest rotation between the two directions
+	"""
+	ratio = np.sqrt( norm(new)/np.maximum( norm(old), 1e-300 ) )
+	moved = ratio[...,None]*_qmul( _arc( old, new ), comps )
+	origin = norm(old) == 0
+	moved[origin] = _frame( new[origin] )
+	return moved
+
+Similarity = namedtuple( 'Similarity', ( 'rotation', 'scale', 'translation' ) )	# p -> scale*rotation(p) + translation
+Pinch = namedtuple( 'Pinch', ( 'delta', 'echo', 'phi' ) )	# factors of the angles
+
+class Transform:
+	"""
+		a geometric transform of whole arrays of quaternions, made of steps
+
+		rotations, scalings and translations are similarities, and consecutive
+		similarities are fused into a single one when transforms are chained
+		with then() ; a pinch is not linear and stays a step of its own. so
+		rotating, scaling and translating 1M vertices is one quaternion
+		product and one move of the array.
+
+		positions are exact ; the orientation of a translated vertex follows
+		the shortest rotation between its old and new directions (for the
+		fused move, when translations were fused)
+	"""
+	def __init__(self, steps = ()):
+		self.steps = tuple( steps )
+
+	def __bool__(self):
+		return bool( self.steps )
+
+	def __repr__(self):
+		return f"Transform{self.steps}"
+
+	@classmethod
+	def rotation(cls, r):
+		"""
+			r: an np.quaternion, an angle (around the z axis) or Euler angles for
+			quaternion.from_euler_angles
+		"""
+		if isinstance(r, np.quaternion):
+			q = quaternion.as_float_array( r.normalized() )
+		elif np.ndim(r) == 0:
+			q = np.array([ np.cos(r/2), 0, 0, np.sin(r/2) ])
+		else:
+			q = quaternion.as_float_array( quaternion.from_euler_angles( *r ) )
+		return cls([ Similarity( q, 1., np.zeros(3) ) ])
+
+	@classmethod
+	def scaling(cls, f, center = None):
+		"""
+			homotecy of factor f > 0, relative to center (the origin by default) ;
+			a quaternion can not hold a reflection
+		"""
+		if not f > 0:
+			raise ValueError(f"can not scale by {f}, the factor must be positive")
+		c = np.zeros(3) if center is None else np.broadcast_to( np.asarray( center, dtype = float ), 3 )
+		return cls([ Similarity( np.array([ 1., 0, 0, 0 ]), float(f), c - f*c ) ])
+
+	@classmethod
+	def translation(cls, xyz):
+		return cls([ Similarity( np.array([ 1., 0, 0, 0 ]), 1., np.broadcast_to( np.asarray( xyz, dtype = float ), 3 ).copy() ) ])
+
+	@classmethod
+	def pinching(cls, f):
+		"""
+			f: factor of the angles
+				float:					delta (azimuth), echo (elevation)
+				(float, float):			echo, delta
+				(float, float, float):	echo, delta, phi (roll)
+		"""
+		if np.ndim(f) == 0:
+			return cls([ Pinch( f, f, 1 ) ])
+		return cls([ Pinch( f[1], f[0], f[2] if len(f) > 2 else 1 ) ])
+
+	def then(self, other):
+		""" this transform, followed by `other` """
+		steps = list( self.steps )
+		for step in other.steps:
+			if steps and isinstance(steps[-1], Similarity) and isinstance(step, Similarity):
+				first = steps.pop()
+				steps.append( Similarity(
+						_qmul( step.rotation, first.rotation ),
+						step.scale*first.scale,
+						step.scale*_rotate( step.rotation, first.translation ) + step.translation,
+					) )
+			else:
+				steps.append( step )
+		return Transform( steps )
+
+	def inverse(self):
+		"""
+			the transform that undoes this one ; the translation of a similarity
+			is undone first, so that orientations come back as they were
+		"""
+		steps = []
+		for step in reversed( self.steps ):
+			if isinstance(step, Similarity):
+				if step.translation.any():
+					steps.append( Similarity( np.array([ 1., 0, 0, 0 ]), 1., -step.translation ) )
+				steps.append( Similarity( step.rotation*( 1, -1, -1, -1 ), 1/step.scale, np.zeros(3) ) )
+			elif 0 in ( step.delta, step.echo, step.phi ):
+				raise ValueError("a pinch by 0 can not be undone")
+			else:
+				steps.append( Pinch( 1/step.delta, 1/step.echo, 1/step.phi ) )
+		return Transform( steps )
+
+	def __call__(self, comps):
+		"""
+			the transformed (N,4) array of quaternion components
+		"""
+		for step in self.steps:
+			if isinstance(step, Similarity):
+				comps = np.sqrt( step.scale )*_qmul( step.rotation, comps )
+				if step.translation.any():
+					xyz = quats_xyz( comps )
+					comps = _move( comps, xyz, xyz + step.translation )
+			else:
+				xyz = quats_xyz( comps )
+				delta, echo, n = np.moveaxis( xyz_polar( xyz ), -1, 0 )
+				frame = _frame( xyz )
+				# what is left once the direction is taken out is a roll around x
+				roll = _qmul( frame*( 1, -1, -1, -1 ), comps )
+				roll = 2*np.arctan2( roll[...,1], roll[...,0] )*step.phi
+				delta, echo = delta*step.delta, echo*step.echo
+				xyz = n[...,None]*np.stack( ( np.cos(echo)*np.cos(delta), np.cos(echo)*np.sin(delta), np.sin(echo) ), axis = -1 )
+				comps = _qmul( _frame( xyz ), np.stack( ( np.cos(roll/2), np.sin(roll/2), 0*roll, 0*roll ), axis = -1 ) )
+		return comps
+
+def _rotate( q, v ):
+	""" the vector v rotated by the unit quaternion q """
+	return _qmul( _qmul( q, np.concatenate( ( [0.], v ) ) ), q*( 1, -1, -1, -1 ) )[1:]
+
+Layers = namedtuple( 'Layers', ( 'count', 'vertex_order', 'vertex_offsets', 'edge_order', 'edge_offsets', 'triangle_order', 'triangle_offsets' ) )
+
+def _chain( n, closed = False ):
+	"""
+		(E,2) int32 edges joining vertices 0, 1, ... n-1 (and back to 0 if closed)
+	"""
+	a = np.arange( n, dtype = np.int32 )
+	if closed:
+		return np.stack( ( a, np.roll(a,-1) ), axis = -1 )
+	return np.stack( ( a[:-1], a[1:] ), axis = -1 )
+
+def _vertex_index( v ):
+	return v.index if isinstance(v, Point) else operator.index(v)
 
 #################################
 #								#
@@ -22,7 +244,8 @@ class Quat(np.quaternion):
 	@classmethod
 	def new_cartesian( self, x_y_z_phi, y = None, z = None, phi = 0 ):
 		"""
-			return a quaternion from cartesian coordinates.
+			return a quaternion from cartesian coordinates, rolled by phi around
+			its own direction
 		"""
 		try:
 			x = x_y_z_phi[0]
@@ -36,10 +259,9 @@ class Quat(np.quaternion):
 		if y is None or z is None:
 			raise ValueError("y and/or z is not set")
 	
-		return quaternion.from_euler_angles(
-				atan(y/x),
-				atan(z/norm(x,y)), 
-				phi ) * pow(norm(x,y,z),1/2)
+		# the direction first, then the roll around the x axis (see Transform.pinching)
+		roll = np.array([ np.cos(phi/2), np.sin(phi/2), 0, 0 ])
+		return np.quaternion( *_qmul( _frame( np.array([[ x, y, z ]], dtype = float ) )[0], roll ) )
 
 	@classmethod
 	def new_polar( self, norm_echo_delta_phi, echo = None, delta = 0, phi = 0 ):
@@ -63,6 +285,14 @@ class Quat(np.quaternion):
 		#print(f"{norm = }\t{echo = }\t{delta = }\t{phi = }")
 		return pow(norm,1/2)*quaternion.from_euler_angles( echo, delta, phi )
 
+	@staticmethod
+	def polar_array( norm, echo, delta = 0, phi = 0 ):
+		"""
+			vectorized new_polar() ; arguments are arrays (or scalars) that are
+			broadcast together, returns an array of np.quaternion
+		"""
+		return np.sqrt(norm)*quaternion.from_euler_angles( echo, delta, phi )
+
 class Point:
 	"""
 		a Point() is a fancy object where coordinates are expressed in quaternions
@@ -74,7 +304,12 @@ class Point:
 		the standard for the axii definitions in the quaternions are shown in 
 		doc/images/quaternion.svg
 
+		once it belongs to a Polytope, a Point is only a lightweight view (an
+		index) into the VertexStore of that Polytope ; until then it holds its
+		quaternion and normals by itself.
 	"""
+	__slots__ = ( 'segment', '_index', '_pending' )
+
 	def __init__(self, segment, normals = None, **kwargs ):
 		"""
 			segment: instance_of_the_segment 
@@ -82,12 +317,17 @@ class Point:
 		"""
 		#if type(segment) is np.quaternion: raise Exception
 		self.segment = segment
-		if normals is None:
-			self._normals = {}
-		else:
-			self._normals = normals
+		self._index = None
+		self._pending = ( kwargs.pop('quat', None), {} if normals is None else normals )
 
-		self._quat = kwargs.pop('quat', None)
+	@classmethod
+	def _view(cls, segment, index):
+		""" a Point that reads and writes the VertexStore of `segment` """
+		self = cls.__new__(cls)
+		self.segment = segment
+		self._index = index
+		self._pending = None
+		return self
 
 	def __str__(self):
 		return f"Point{self.components}"
@@ -95,21 +335,39 @@ class Point:
 	def __repr__(self):
 		return f"<Point{self.components} 0x{hex(id(self))}>"
 
+	def __eq__(self, other):
+		if self._pending is not None or not isinstance(other, Point):
+			return self is other
+		return self.segment is other.segment and self._index == other._index
+
+	def __hash__(self):
+		if self._pending is not None:
+			return id(self)
+		return hash(( id(self.segment), self._index ))
+
 	@property
 	def index(self):
 		return self._index
-		# yuk probably very slow because called often!
-		#return f.vertices.index( point )
 	
 	@property
 	def quat(self):
-		# yuk probably slow downstream unless cached (with refresh rate problems)
-		if self._quat is None:
-			return self.segment._default_quat( self.index )
-		elif str(type(self._quat)) == "<class 'function'>":
-			return self._quat( *self.segment._omega_psi )
+		if self._pending is not None:
+			return self._pending[0]
+		return self.segment.vertex_quat( self._index )
+
+	@quat.setter
+	def quat(self, q):
+		if self._pending is not None:
+			self._pending = ( q, self._pending[1] )
 		else:
-			return self._quat
+			self.segment.set_vertex_quat( self._index, q )
+
+	@property
+	def normals(self):
+		""" whatever properties are attached to the point (color, extrusion, feed...) """
+		if self._pending is not None:
+			return self._pending[1]
+		return Normals( self.segment.store, self._index )
 
 	@property
 	def components(self):
@@ -134,13 +392,12 @@ class Point:
 	@property
 	def d(self):
 		""" delta (azimuth/yaw on the horizontal plane, positive in the CCW direction) """
-		#print(f"{self.components = }")
-		return self.quat.a*pow(1j,-1/2)
+		return self.polar[0]
 
 	@property
 	def e(self):
 		""" echo (elevation/pitch relative to the origin) """
-		return norm( (self.components[0], self.components[2]) )*qi
+		return self.polar[1]
 
 	@property
 	def p(self):
@@ -150,26 +407,20 @@ class Point:
 	@property
 	def polar(self):
 		"""
-			returns polar components without phi (roll axis)
-
-			make sure to read the note on quaternion.as_euler_angles()
+			returns polar components (delta, echo, norm) without phi (roll axis)
 		"""
-		return np.array([ self.d, self.e, self.quat.norm() ])
+		if self._pending is not None:
+			return xyz_polar( self.xyz )
+		return self.segment.vertex_polar( self._index )
 
 	@property
 	def xyz(self):
 		"""
 			returns (x,y,z) components in the cartesian subsystem.
-
-			make sure to read the note on quaternion.as_euler_angles()
 		"""
-		# projection on x-y plane (cartesian)
-		xy = self.quat.norm() * np.cos(self.e)
-		return np.array( [
-				xy * np.cos(self.d),
-				xy * np.sin(self.d),
-				self.quat.norm() * np.sin(self.e)
-			])
+		if self._pending is not None:
+			return quats_xyz( self.components )
+		return self.segment.vertex_xyz( self._index )
 	
 
 	@property
@@ -211,36 +462,30 @@ class Point:
 	"""
 		geometric transforms
 	"""
-	def rotate(self, delta_echo_phi, echo = None, phi = None):
-		"""
-			TODO
+	def _apply(self, transform):
+		self.quat = np.quaternion( *transform( self.components[None] )[0] )
+		return self
 
-			rotate point by Euler angles, relative to origin
+	def rotate(self, r):
 		"""
-		return self
+			rotate point relative to origin (see Transform.rotation)
+		"""
+		return self._apply( Transform.rotation( r ) )
 	
-	@classmethod
-	def translate(self, xyz, y = None, z = None):
+	def translate(self, xyz, y = None, z = 0):
 		"""
-			translate point by x,y,z vector, relative to coordinate system. phi stays fixed.
+			translate point by x,y,z vector, relative to coordinate system.
 		"""
-		try:
-			x, y, z = xyz
-		except IndexError:
-			x = xyz
-
-		self.quat = new_cartesian( self.xyz + xyz, phi = self.phi )
-		return self
+		if y is not None:
+			xyz = ( xyz, y, z )
+		return self._apply( Transform.translation( xyz ) )
 
-	@classmethod
-	def scale(self, f ):
+	def scale(self, f, center = None):
 		"""
-			"resize" point by a factor f, relative to origin
+			"resize" point by a factor f, relative to center (origin by default)
 		"""
-		self.quat *= pow(f,1/2)
-		return self
+		return self._apply( Transform.scaling( f, center ) )
 	
-	@classmethod
 	def pinch(self, f):
 		"""
 			'pinch' reduces the angles while maintaining the norm
@@ -252,17 +497,177 @@ class Point:
 				(float, float):			echo, delta
 				(float, float, float):	echo, delta, phi
 		"""
-		if type(f) is int:
-			self.quat = Quat.new_polar( self.norm, self.e*f, self.d*f, self.phi )
-		else:
-			match len(f):
-				case 2:
-					self.quat = Quat.new_polar( self.norm, self.e*f[0], self.d*f[1], self.phi )
-				case 3:
-					self.quat = Quat.new_polar( self.norm, self.e*f[0], self.d*f[1], self.phi*f[2] )
+		return self._apply( Transform.pinching( f ) )
+
 
+
+class VertexStore:
+	"""
+		columnar storage for the vertices of a Polytope
+
+		the quaternion of every vertex is kept in `quats`, a contiguous (N,4)
+		float64 array of components ; only the rows flagged in `explicit` were
+		set by the user, the other ones are computed by the Polytope itself (see
+		Polytope.vertex_quat) and `funcs` holds the vertices whose quaternion is a
+		function.
+
+		what used to be the `_normals` dict of each Point is stored in typed
+		columns (NaN means "not set") ; anything that has no column goes into
+		`extra`, a sparse { index: dict } mapping.
+	"""
+	columns = {
+		'color': ( np.float32, (4,) ),	# RGBA
+		'extrusion': ( np.float32, () ),
+		'feed': ( np.float32, () ),
+	}
+
+	def __init__(self, n = 0):
+		self.quats = np.zeros( (n,4) )
+		self.explicit = np.zeros( n, dtype = bool )
+		self.funcs = {}
+		self.attrs = { name: np.full( (n,)+shape, np.nan, dtype = dtype ) for name, (dtype, shape) in self.columns.items() }
+		self.extra = {}
+
+	def __len__(self):
+		return len(self.quats)
+
+	@classmethod
+	def from_points(cls, points):
+		"""
+			build a store from a sequence of Point instances
+		"""
+		self = cls( len(points) )
+		for i, p in enumerate(points):
+			self.set_quat( i, p.quat )
+			for key, value in p.normals.items():
+				self.set_attr( i, key, value )
 		return self
 
+	@classmethod
+	def from_quats(cls, comps, attrs = None):
+		"""
+			build a store around an (N,4) array of quaternion components and
+			optionally a dict of attribute columns (which are not copied, so they
+			can be memory-mapped)
+		"""
+		self = cls()
+		self.quats = comps
+		self.explicit = np.ones( len(comps), dtype = bool )
+		attrs = attrs or {}
+		# missing columns are read-only views of a single NaN until set_attr()
+		self.attrs = { name: attrs[name] if name in attrs else np.broadcast_to( dtype(np.nan), (len(comps),)+shape ) for name, (dtype, shape) in self.columns.items() }
+		return self
+
+	def resize(self, n):
+		"""
+			truncates or extends (with unset vertices) to n vertices
+		"""
+		def fit(array, fill):
+			new = np.full( (n,)+array.shape[1:], fill, dtype = array.dtype )
+			new[:min(n, len(array))] = array[:n]
+			return new
+		self.quats = fit( self.quats, 0 )
+		self.explicit = fit( self.explicit, False )
+		self.attrs = { key: fit( col, np.nan ) for key, col in self.attrs.items() }
+		self.funcs = { i: f for i, f in self.funcs.items() if i < n }
+		self.extra = { i: d for i, d in self.extra.items() if i < n }
+
+	@property
+	def nbytes(self):
+		return self.quats.nbytes + self.explicit.nbytes + sum( a.nbytes for a in self.attrs.values() )
+
+	def set_quat(self, index, q):
+		self.funcs.pop( index, None )
+		if q is None:
+			self.explicit[index] = False
+		elif callable(q):
+			self.funcs[index] = q
+			self.explicit[index] = False
+		else:
+			self.quats[index] = q.components
+			self.explicit[index] = True
+
+	def set_attr(self, index, key, value):
+		if key in self.attrs:
+			if not self.attrs[key].flags.writeable:
+				self.attrs[key] = self.attrs[key].copy()
+			self.attrs[key][index] = value
+		else:
+			self.extra.setdefault( index, {} )[key] = value
+
+	def get_attrs(self, index):
+		attrs = { key: col[index] for key, col in self.attrs.items() if not np.isnan( col[index] ).all() }
+		attrs.update( self.extra.get( index, {} ) )
+		return attrs
+
+class ComputedStore(VertexStore):
+	"""
+		the store of a Polytope that computes all of its vertices (ie. a
+		LazySpiral, Instances) : it holds nothing and can not be written to
+	"""
+	def set_quat(self, index, q):
+		raise TypeError("the vertices of this Polytope are computed, they can not be set individually")
+
+	def set_attr(self, index, key, value):
+		raise TypeError("the vertices of this Polytope are computed, they have no attributes of their own")
+
+	def get_attrs(self, index):
+		return {}
+
+class Normals(MutableMapping):
+	"""
+		dict-like view on the attributes of a single vertex of a VertexStore
+	"""
+	__slots__ = ( 'store', 'index' )
+
+	def __init__(self, store, index):
+		self.store = store
+		self.index = index
+
+	def __getitem__(self, key):
+		return self.store.get_attrs( self.index )[key]
+
+	def __setitem__(self, key, value):
+		self.store.set_attr( self.index, key, value )
+
+	def __delitem__(self, key):
+		if key in self.store.attrs:
+			if key not in self:
+				raise KeyError(key)
+			self.store.attrs[key][self.index] = np.nan
+		else:
+			del self.store.extra.get( self.index, {} )[key]
+
+	def __iter__(self):
+		return iter( self.store.get_attrs( self.index ) )
+
+	def __len__(self):
+		return len( self.store.get_attrs( self.index ) )
+
+	def __repr__(self):
+		return repr( self.store.get_attrs( self.index ) )
+
+class Vertices(Sequence):
+	"""
+		the vertices of a Polytope, as Point views created on demand
+	"""
+	__slots__ = ( 'polytope', )
+
+	def __init__(self, polytope):
+		self.polytope = polytope
+
+	def __len__(self):
+		return self.polytope.len
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [ Point._view( self.polytope, i ) for i in range( *index.indices(len(self)) ) ]
+		index = operator.index(index)
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError("vertex index out of range")
+		return Point._view( self.polytope, index )
 
 
 class Polytope:
@@ -275,13 +680,33 @@ class Polytope:
 		  needs not be equal to the total number of combinations of vertices
 		* a number of faces that are a looped sequence of vertices ; the orientation 
 
+		the topology is held in arrays of vertex indices : `edge_array` is (E,2)
+		int32 and the faces are stored CSR-style, the vertices of face `f` being
+		face_indices[face_offsets[f]:face_offsets[f+1]] ; `edges` and `faces` are
+		the (Point, Point) tuples built from them on demand.
+
 		TODO: area, volume
 	"""
+	layer_height = .2	# see layers()
+	topology = 0	# bumped every time edges or faces are assigned
+	edits = 0	# bumped every time a vertex is set (see set_vertex_quat)
+
 	def __init__( self, vertices, edges, faces, *, 
 			gamma_range = (( 0, qi, np.linspace ), ( 0, qi, np.linspace)),	# third argument is len(self.vertices)
 			steps = 3,	# how many "steps" or layers to use for gamma.imag ("elevation")
 			name = 'Polytope' ):
-		self.vertices = vertices
+		if isinstance(vertices, VertexStore):
+			self.store = vertices
+		elif type(vertices) is int:
+			self.store = VertexStore( vertices )
+		else:
+			self.store = VertexStore.from_points( vertices )
+			for i, p in enumerate(vertices):
+				p.segment, p._index, p._pending = self, i, None
+		self.vertices = Vertices( self )
+		self.generation = 0	# bumped every time cached values become stale
+		self._cache = {}
+		self.transform = Transform()
 		self.edges = edges
 		self.faces = faces
 		self.steps = steps
@@ -290,32 +715,452 @@ class Polytope:
 		self._gamma_range = gamma_range
 		self.range_reset()
 	
+	@staticmethod
+	def from_arrays( quats, edges = None, faces = None, name = 'Polytope', attrs = None ):
+		"""
+			a plain Polytope made of already computed arrays (see quats(),
+			edge_array, face_offsets and face_indices, store.attrs)
+		"""
+		return Polytope( VertexStore.from_quats( quats, attrs ), edges, faces, name = name )
+
+	@staticmethod
+	def from_dict( arrays, name = 'Polytope' ):
+		"""
+			the Polytope of a dict of arrays as returned by arrays() ; other keys
+			are ignored
+		"""
+		faces = ( arrays['face_offsets'], arrays['face_indices'] ) if 'face_offsets' in arrays else None
+		attrs = { key[5:]: array for key, array in arrays.items() if key.startswith('attr.') }
+		return Polytope.from_arrays( arrays['quats'], arrays['edges'], faces, name = name, attrs = attrs )
+
+	def arrays(self, quats = True):
+		"""
+			{ name: array } of what the Polytope is made of: 'quats' (N,4) unless
+			quats is False (ie. to stream them through chunks()), 'edges' (E,2),
+			'face_offsets' and 'face_indices' if it has faces and 'attr.<name>'
+			for every attribute column that is set somewhere
+		"""
+		arrays = { 'quats': self.quats() } if quats else {}
+		arrays['edges'] = self.edge_array
+		if self.face_offsets is not None:
+			arrays['face_offsets'] = self.face_offsets
+			arrays['face_indices'] = self.face_indices
+		for name, column in self.store.attrs.items():
+			if not np.isnan( column ).all():
+				arrays['attr.'+name] = column
+		return arrays
+
+	def save(self, path, layers = True):
+		"""
+			writes the Polytope to a binary file (see toolpath.py)
+		"""
+		import toolpath
+		toolpath.save( self, path, layers )
+
+	@staticmethod
+	def load( path ):
+		"""
+			a Polytope saved with save(), memory-mapped from the file
+		"""
+		import toolpath
+		return toolpath.load( path )
+
+	def resize(self, n):
+		"""
+			changes the number of vertices, keeping the first ones
+		"""
+		self.store.resize( n )
+		self.range_reset()
+
 	def range_reset(self):
 		"""
 			must be called after the number of vertices is changed
 		"""
-		self.len = len(self.vertices)
+		self.len = len(self.store)
+		self._gammas = None
+		self.invalidate()
+
+	@property
+	def gammas(self):
+		"""
+			sampled on first use, so that Polytopes whose vertices are all
+			explicit (ie. loaded from arrays) never allocate them
+		"""
+		if self._gammas is None:
+			self._gammas = [ self._gamma_range[0][2]( self._gamma_range[0][0], self._gamma_range[0][1], self.len ),
+				self._gamma_range[1][2]( self._gamma_range[1][0], self._gamma_range[1][1], self.steps ) ]
+		return self._gammas
 
-		self.gammas = [ self._gamma_range[0][2]( self._gamma_range[0][0], self._gamma_range[0][1], self.len ),
-			self._gamma_range[1][2]( self._gamma_range[1][0], self._gamma_range[1][1], self.steps ) ]
+	def invalidate(self):
+		"""
+			must be called whenever the geometry changes (parameters, transforms..) ;
+			values computed for an older generation are never served again
+		"""
+		self.generation += 1
 
-		for i in range(self.len):
-			# in case of update problems, make _index a property with setter
-			self.vertices[i]._index = i
+	def _cached(self, key, build):
+		"""
+			returns build() and keeps it until the next invalidate()
+		"""
+		try:
+			generation, value = self._cache[key]
+		except KeyError:
+			pass
+		else:
+			if generation == self.generation:
+				return value
+		value = build()
+		self._cache[key] = ( self.generation, value )
+		return value
 	
+	def quats(self):
+		"""
+			the components of all vertex quaternions, as an (N,4) float64 array
+		"""
+		return self._cached( 'quats', self._eval )
+
+	def xyz(self):
+		"""
+			cartesian coordinates of all vertices, as an (N,3) float64 array
+		"""
+		return self._cached( 'xyz', lambda: quats_xyz( self.quats() ) )
+
+	def polar(self):
+		"""
+			(delta, echo, norm) of all vertices, as an (N,3) float64 array
+		"""
+		return self._cached( 'polar', lambda: xyz_polar( self.xyz() ) )
+
+	def window(self, start, stop):
+		"""
+			the (stop-start,4) quaternion components of vertices start..stop ; this
+			does not fill the cache, so that huge Polytopes can be walked through
+			with bounded memory
+		"""
+		try:
+			generation, comps = self._cache['quats']
+		except KeyError:
+			pass
+		else:
+			if generation == self.generation:
+				return comps[start:stop]
+		return self._eval( start, stop )
+
+	def chunks(self, size = 1<<16):
+		"""
+			yields ( start, components ) for consecutive windows of `size` vertices
+		"""
+		for start in range( 0, self.len, size ):
+			yield start, self.window( start, min( start+size, self.len ) )
+
+	def linked(self, start, stop):
+		"""
+			boolean array, True where vertex i is joined to vertex i-1 by an edge
+			(in either direction), for i in start..stop
+		"""
+		def build():
+			linked = np.zeros( self.len, dtype = bool )
+			a, b = self.edge_array.T
+			linked[ b[ b == a+1 ] ] = True
+			linked[ a[ a == b+1 ] ] = True
+			return linked
+		return self._cached( 'linked', build )[start:stop]
+
+	def extra_edges(self):
+		"""
+			(J,2) the edges that linked() does not cover, ie. that do not join
+			vertex i-1 to vertex i, sorted by their first vertex
+		"""
+		def build():
+			a, b = self.edge_array.T
+			extra = self.edge_array[ np.abs( a.astype( np.int64 ) - b ) != 1 ]
+			return extra[ np.argsort( extra[:,0], kind = 'stable' ) ]
+		return self._cached( 'extra_edges', build )
+
+	def _eval(self, start = 0, stop = None):
+		""" _eval_quats(), transformed """
+		comps = self._eval_quats( start, stop )
+		return self.transform( comps ) if self.transform else comps
+
+	def _eval_quats(self, start = 0, stop = None):
+		store = self.store
+		stop = self.len if stop is None else stop
+		if not store.funcs and store.explicit[start:stop].all():
+			# nothing to compute, ie. loaded from arrays: no copy
+			return store.quats[start:stop]
+		comps = store.quats[start:stop].copy()
+		implicit = ~store.explicit[start:stop]
+		for index, func in store.funcs.items():
+			if start <= index < stop:
+				implicit[index-start] = False
+				comps[index-start] = func( *self._omega_psi ).components
+		if implicit.all():
+			comps[:] = quaternion.as_float_array( self._default_quats( slice(start, stop) ) )
+		elif implicit.any():
+			comps[implicit] = quaternion.as_float_array( self._default_quats( start + np.flatnonzero(implicit) ) )
+		return comps
+
+	"""
+		geometric transforms
+
+		they are not applied to the vertex store but to what is evaluated from
+		it (see Transform), so they also work for vertices that are computed
+		(ie. a Spiral) and cost nothing until the vertices are needed. Points
+		read transformed quaternions and what is assigned to Point.quat goes
+		through the inverse transform (see set_vertex_quat).
+	"""
+	def transformed(self, transform):
+		""" appends `transform` to the transform of the Polytope """
+		self.transform = self.transform.then( transform )
+		self.invalidate()
+		return self
+
+	def rotate(self, r):
+		""" see Transform.rotation """
+		return self.transformed( Transform.rotation( r ) )
+
+	def translate(self, xyz, y = None, z = 0):
+		if y is not None:
+			xyz = ( xyz, y, z )
+		return self.transformed( Transform.translation( xyz ) )
+
+	def scale(self, f, center = None):
+		return self.transformed( Transform.scaling( f, center ) )
+
+	def pinch(self, f):
+		""" see Transform.pinching """
+		return self.transformed( Transform.pinching( f ) )
+
 	def __str__( self ):
-		return f"{self.name} (F={self._faces},E={len(self.edges)},V={len(self.vertices)})"
+		return f"{self.name} (F={self._faces},E={self.edge_count},V={len(self.vertices)})"
+
+	@property
+	def edge_count(self):
+		return len(self.edge_array)
+
+	@property
+	def edges(self):
+		v = self.vertices
+		return [ ( v[a], v[b] ) for a, b in self.edge_array.tolist() ]
+
+	@edges.setter
+	def edges(self, edges):
+		"""
+			edges: an (E,2) array of vertex indices, or a sequence of (Point, Point)
+		"""
+		self._topology_changed( 'adjacency', 'linked', 'extra_edges' )
+		if edges is None or len(edges) == 0:
+			self.edge_array = np.empty( (0,2), dtype = np.int32 )
+		elif isinstance(edges, np.ndarray) and edges.dtype != object:
+			self.edge_array = edges.astype( np.int32, copy = False ).reshape(-1,2)
+		else:
+			self.edge_array = np.array([ [ _vertex_index(a), _vertex_index(b) ] for a, b in edges ], dtype = np.int32 )
+
+	def _topology_changed(self, *keys):
+		""" drops the cached `keys` and the layer indexes, which sort edges and triangles """
+		self.topology += 1
+		for key in list( self._cache ):
+			if key in keys or ( isinstance(key, tuple) and key[0] == 'layers' ):
+				del self._cache[key]
+
+	@property
+	def faces(self):
+		if self.face_offsets is None:
+			return None
+		v = self.vertices
+		return [ [ ( v[a], v[b] ) for a, b in zip( loop, loop[1:]+loop[:1] ) ] for loop in self.face_loops() ]
+
+	@faces.setter
+	def faces(self, faces):
+		"""
+			faces: a ( offsets, indices ) pair of arrays, or a sequence of faces where
+			each face is a sequence of vertices (Points or indices) or of edges
+			(Point, Point) ; anything else means the Polytope has no faces
+		"""
+		self._topology_changed( 'triangles' )
+		if isinstance(faces, tuple) and len(faces) == 2 and isinstance(faces[0], np.ndarray):
+			self.face_offsets = faces[0].astype( np.int64, copy = False )
+			self.face_indices = faces[1].astype( np.int32, copy = False )
+			return
+		try:
+			loops = [ [ _vertex_index( v[0] if isinstance(v, tuple) else v ) for v in face ] for face in faces ]
+		except TypeError:
+			self.face_offsets = self.face_indices = None
+			return
+		self.face_offsets = np.cumsum( [0] + [ len(loop) for loop in loops ], dtype = np.int64 )
+		self.face_indices = np.array( [ i for loop in loops for i in loop ], dtype = np.int32 )
+
+	def face_loops(self):
+		"""
+			the vertex indices of each face, as a list of lists (none if the
+			Polytope has no faces)
+		"""
+		if self.face_offsets is None or not len(self.face_indices):
+			return []
+		return [ loop.tolist() for loop in np.split( self.face_indices, self.face_offsets[1:-1] ) ]
+
+	def triangles(self):
+		"""
+			(T,3) vertex indices of the faces split in triangles (as fans, so
+			faces are expected to be convex)
+		"""
+		def build():
+			if self.face_offsets is None:
+				return np.empty( (0,3), dtype = np.int32 )
+			starts = self.face_offsets[:-1]
+			count = np.maximum( np.diff( self.face_offsets ) - 2, 0 )
+			first = np.repeat( starts, count )
+			j = np.arange( count.sum() ) - np.repeat( np.cumsum(count) - count, count ) + 1
+			idx = self.face_indices
+			return np.stack( ( idx[first], idx[first+j], idx[first+j+1] ), axis = -1 )
+		return self._cached( 'triangles', build )
+
+	def layers(self, height = None):
+		"""
+			per-layer index of the vertices, edges and triangles, for clipping
+
+			a layer is a slab of `height` (self.layer_height by default) along z,
+			counted from the lowest vertex ; edges and triangles belong to the
+			layer of their lowest vertex. each kind is sorted by layer, so that
+			layers a to b (included) are ie. the edges
+				edge_order[ edge_offsets[a]:edge_offsets[b+1] ]
+			vertices that are not finite (ie. the pole of a Hyperbolic spiral) are
+			in no layer, nor are the edges and triangles they belong to
+		"""
+		height = self.layer_height if height is None else height
+		def build():
+			xyz = self.xyz()
+			finite = np.isfinite( xyz ).all( axis = 1 )
+			z = xyz[:,2]
+			layer = np.full( self.len, -1, dtype = np.int64 )
+			if finite.any():
+				layer[finite] = np.floor( ( z[finite] - z[finite].min() )/height )
+			count = int( layer.max() )+1 if finite.any() else 0
+			def index(of):
+				inside = np.flatnonzero( of >= 0 )
+				order = inside[ np.argsort( of[inside], kind = 'stable' ) ]
+				offsets = np.zeros( count+1, dtype = np.int64 )
+				np.cumsum( np.bincount( of[inside], minlength = count ), out = offsets[1:] )
+				return order, offsets
+			return Layers( count,
+					*index( layer ),
+					*index( layer[ self.edge_array ].min( axis = 1 ) ),
+					*index( layer[ self.triangles() ].min( axis = 1 ) ) )
+		return self._cached( ( 'layers', height ), build )
+
+	def adjacency(self):
+		"""
+			CSR ( offsets, indices ) of the vertices joined to each vertex by an edge
+		"""
+		def build():
+			pairs = np.concatenate(( self.edge_array, self.edge_array[:,::-1] ))
+			pairs = pairs[ np.argsort( pairs[:,0], kind = 'stable' ) ]
+			offsets = np.zeros( self.len+1, dtype = np.int64 )
+			np.cumsum( np.bincount( pairs[:,0], minlength = self.len ), out = offsets[1:] )
+			return offsets, pairs[:,1].copy()
+		return self._cached( 'adjacency', build )
 	
+	def vertex_quat(self, index):
+		"""
+			the quaternion of vertex `index`
+		"""
+		return np.quaternion( *self.quats()[index] )
+
+	def vertex_xyz(self, index):
+		return self.xyz()[index]
+
+	def vertex_polar(self, index):
+		return self.polar()[index]
+
+	def set_vertex_quat(self, index, q):
+		"""
+			sets the quaternion of vertex `index` (see VertexStore.set_quat)
+
+			q is where the vertex is read, after the transform of the Polytope :
+			the store gets it through the inverse of the transform. functions (and
+			None, the default) give untransformed quaternions, like every vertex
+			the Polytope computes.
+
+			an explicit quaternion is written into the rows of the cached arrays
+			(quats, xyz, polar) so that editing vertices one by one costs no
+			evaluation of the whole Polytope ; what depends on all the positions
+			(layers) is dropped. a function or None needs the vertex to be
+			evaluated again, which invalidates everything.
+		"""
+		self.edits += 1
+		if q is None or callable(q):
+			self.store.set_quat( index, q )
+			self.invalidate()
+			return
+		comps = q.components
+		if self.transform:
+			q = np.quaternion( *self.transform.inverse()( comps[None] )[0] )
+		self.store.set_quat( index, q )
+		rows = { 'quats': comps }
+		rows['xyz'] = quats_xyz( comps )
+		rows['polar'] = xyz_polar( rows['xyz'] )
+		for key in list( self._cache ):
+			generation, value = self._cache[key]
+			if key in rows and generation == self.generation and value.flags.writeable:
+				value[index] = rows[key]
+			elif key in rows or ( isinstance(key, tuple) and key[0] == 'layers' ):
+				del self._cache[key]
+
+	def _default_quats(self, index = slice(None)):
+		"""
+			the default quaternions of several vertices at once (all of them by
+			default) ; subclasses that can do better than a loop override this
+		"""
+		return np.array([ self._default_quat(i) for i in np.arange(self.len)[index] ], dtype = np.quaternion)
+
 	def _gamma(self, point_index):
 		# TODO not sure about return value % and //
 		return self.gammas[0][point_index%self.len]# + self.gammas[1][point_index//l]*1j	TODO .imag reserved for Surface (SuperSeg)
 	
 	@property
 	def _faces(self):
-		try:
-			return len(self.faces)
-		except TypeError:
+		if self.face_offsets is None:
 			return 'n/a'
+		return len(self.face_offsets)-1
+
+
+class ComputedPolytope(Polytope):
+	"""
+		base of the Polytopes that compute all of their vertices and topology
+		(LazySpiral, Instances) rather than store them
+
+		their store is a ComputedStore, so vertices can not be set one by one,
+		and assigning edges or faces does nothing: subclasses provide
+		edge_array (and face_offsets, face_indices if they have faces).
+		single vertices are read through window(), which never evaluates the
+		whole Polytope
+	"""
+	face_offsets = face_indices = None
+
+	@property
+	def edges(self):
+		return Polytope.edges.fget( self )
+
+	@edges.setter
+	def edges(self, edges):
+		pass
+
+	@property
+	def faces(self):
+		return Polytope.faces.fget( self )
+
+	@faces.setter
+	def faces(self, faces):
+		pass
+
+	def vertex_quat(self, index):
+		return np.quaternion( *self.window( index, index+1 )[0] )
+
+	def vertex_xyz(self, index):
+		return quats_xyz( self.window( index, index+1 )[0] )
+
+	def vertex_polar(self, index):
+		return xyz_polar( self.vertex_xyz( index ) )
 
 
 #################################
@@ -331,11 +1176,55 @@ class Polygon(Polytope):
 
 		r = radius of circle
 		vertices = number of dots (aka "obvious resolution")
-		convexity = how many dots to skip when connecting polygon
-		alpha = number of half-turns of the polygon (Pi multiplicator ; 2*Pi is one full rotation), a value of 1 will make a half-circle with `sides` sides
-		resolution = how many subdivisions for a single segment (see resolution_func() )
+		convexity = how many dots to skip when connecting polygon ; this draws the star polygon {vertices/convexity}, made of gcd(vertices, convexity) separate loops (ie. {6/2} is two triangles)
+		arange = ( start, stop ) angles of the first and last dot ; a full turn makes a closed polygon, anything else an open arc (ie. (0, np.pi) is a half-circle)
+		resolution = how many subdivisions for a single segment (the extra vertices lay on the straight side)
 
+		the vertices are stored in drawing order, loop after loop
 		'''
+		if vertices < 2 or not 0 < convexity < vertices or resolution < 1:
+			raise ValueError(f"can not draw a polygon of {vertices} vertices, convexity {convexity} and resolution {resolution}")
+		self.r, self.convexity, self.arange, self.resolution = r, convexity, arange, resolution
+		n, c = vertices, convexity
+		span = arange[1] - arange[0]
+		closed = bool( np.isclose( abs(span), 2*np.pi ) )
+		corners = r*np.exp( 1j*( arange[0] + span*np.arange(n)/( n if closed else n-1 ) ) )
+
+		# corners in drawing order, dots s, s+c, s+2c... of every loop s, and
+		# where each side goes
+		if closed:
+			loops = np.gcd( n, c )
+			order = ( ( np.arange(loops)[:,None] + c*np.arange(n//loops) ) % n )
+			to = np.roll( order, -1, axis = 1 ).ravel()
+			order = order.ravel()
+			loop = np.repeat( np.arange(loops), n//loops )
+			last = np.zeros( n, dtype = bool )
+		else:
+			loops = c
+			order = np.lexsort(( np.arange(n), np.arange(n) % c ))
+			loop = order % c
+			last = np.append( loop[1:] != loop[:-1], True )	# the end of an open loop starts no side
+			to = np.where( last, order, np.roll( order, -1 ) )
+
+		# every side is split in `resolution` vertices along the chord
+		counts = np.where( last, 1, resolution )
+		t = ( np.arange( counts.sum() ) - np.repeat( np.cumsum(counts) - counts, counts ) )/resolution
+		points = np.repeat( corners[order], counts ) + t*np.repeat( corners[to] - corners[order], counts )
+		loop = np.repeat( loop, counts )
+
+		starts = np.flatnonzero( np.insert( loop[1:] != loop[:-1], 0, True ) )
+		ends = np.append( starts[1:], len(points) ) - 1
+		inner = np.flatnonzero( loop[1:] == loop[:-1] )
+		edges = np.stack( ( inner, inner+1 ), axis = -1 )
+		faces = None
+		if closed:
+			edges = np.concatenate(( edges, np.stack( ( ends, starts ), axis = -1 ) ))
+			if c == loops:
+				# every loop is a convex polygon
+				faces = ( np.append( starts, len(points) ), np.arange( len(points), dtype = np.int32 ) )
+
+		comps = quaternion.as_float_array( Quat.polar_array( np.abs(points), np.angle(points) ) )
+		super().__init__( VertexStore.from_quats( comps ), edges, faces, name = 'Polygon' )
 
 import spirals
 
@@ -363,11 +1252,50 @@ class Spiral(Polytope):
 
 		see https://en.wikipedia.org/wiki/Spiral
 	"""
-	def __init__(self, vertices, func, **kwargs ):
+	def __init__(self, vertices, func, tolerance = None, max_length = None, **kwargs ):
 		"""
 			vertices: number of vertices, or a list of vertices
 			func: a tuple ( 'ArbitraryName', func_args, [ func, ] ) where func_args is a dict, func is called as func( phi, func_args )
+			tolerance, max_length: see adapt() ; `vertices` is then only a starting point
 		"""
+		self._set_func( func )
+		self.adaptive = None
+
+		super().__init__( vertices, 
+				edges = None,
+				faces = NotImplementedError,
+				name = func[0]
+			)
+		self._chain()
+		if tolerance is not None or max_length is not None:
+			self.adapt( tolerance, max_length )
+
+	def adapt(self, tolerance = None, max_length = None):
+		"""
+			spaces gamma along the curve rather than uniformly (see
+			spirals.adaptive) ; the number of vertices becomes whatever is needed
+
+			tolerance: max distance between a chord and the curve
+			max_length: max length of a chord
+			adapt() without arguments goes back to np.linspace
+		"""
+		start, stop = self._gamma_range[0][:2]
+		if tolerance is None and max_length is None:
+			self.adaptive = None
+			self._gamma_range = ( ( start, stop, np.linspace ), self._gamma_range[1] )
+			self.range_reset()
+			return self
+
+		self.adaptive = ( tolerance, max_length )
+		gammas = spirals.adaptive( start, stop, self.func, tolerance, max_length, **self.fargs )
+		self._gamma_range = ( ( start, stop, lambda start, stop, n: gammas ), self._gamma_range[1] )
+		if len(gammas) != self.len:
+			self.resize( len(gammas) )
+		else:
+			self.range_reset()
+		return self
+
+	def _set_func(self, func):
 		match func[0]:
 			case 'Ellipse':
 				self.func = spirals.Ellipse
@@ -392,7 +1320,8 @@ class Spiral(Polytope):
 				self.func = spirals.Involute
 			case other:
 				self.func = func[2]
-		self.fargs = func[1]
+		self._fargs = func[1]
+		self.name = func[0]
 
 		if str(type(self.func)) != "<class 'function'>":
 			print(f"ERROR, not a function: {self.func}")
@@ -401,46 +1330,368 @@ class Spiral(Polytope):
 			print(f"ERROR, not a dict: {self.dict}")
 			raise Exception
 
-		if type(vertices) is int:
-			vertices = [Point(self) for _ in range(vertices)]
+	@property
+	def fargs(self):
+		""" arguments of self.func ; assign a new dict rather than editing this one in place """
+		return self._fargs
+
+	@fargs.setter
+	def fargs(self, fargs):
+		self._fargs = fargs
+		self.invalidate()
+
+	def update(self, vertices = None, func = None, **fargs):
+		"""
+			changes parameters in place ; the vertex store and the topology are
+			kept, and only what depends on the change is recomputed (lazily)
+
+			vertices: new number of vertices (an adaptive Spiral goes back to uniform)
+			func: new ( 'ArbitraryName', func_args, [ func, ] ) tuple
+			fargs: func_args to change, ie. update( k = .3 )
+		"""
+		if func is not None:
+			self._set_func( func )
+		if fargs:
+			self._fargs = { **self._fargs, **fargs }
+		if self.adaptive is not None:
+			if vertices is None:
+				return self.adapt( *self.adaptive )
+			self.adapt()
+		if vertices is not None and vertices != self.len:
+			self.resize( vertices )
+		else:
+			self.invalidate()
+		return self
+
+	def resize(self, n):
+		super().resize( n )
+		self._chain()
+
+	def _chain(self):
+		""" a Spiral is a single path through all its vertices """
+		self.edges = _chain( self.len )
 
-		super().__init__( vertices, 
-				edges = [(vertices[i], vertices[i+1]) for i in range(len(vertices)-1)],
-				faces = NotImplementedError,
-				name = func[0]
-			)
-	
 	def __repr__(self):
 		return f"<{self.name} Spiral 0x{hex(id(self))}, V={len(self.vertices)} {self.fargs} 0x{hex(id(self.func))}>"
 	
 	def _default_quat(self, index):
-		# yuk that reeks like memleaks and lots of CPU for new quaternion instances
 		# TODO won't do any sort of interpolation between segments -> .imag
-		return Quat.new_polar( self.func( self._gamma( index ).real, **self.fargs ), self._gamma( index ).real )
+		return self._default_quats( [index % self.len] )[0]
+
+	def _default_quats(self, index = slice(None)):
+		"""
+			evaluates self.func over a whole range of gamma in one go
+		"""
+		gammas = self.gammas[0][index].real
+		return Quat.polar_array( self.func( gammas, **self.fargs ), gammas )
+
+class LazySpiral(ComputedPolytope, Spiral):
+	"""
+		a Spiral that holds no per-vertex array, for paths of many millions of
+		vertices that are only ever walked through a window at a time (streaming
+		export, clipped preview)
+
+		the gamma of vertex i is computed from i (gamma_range is always sampled
+		uniformly), vertices are evaluated `chunk` at a time and the last
+		`keep` chunks are kept, so memory is bounded whatever the length.
+		window(), chunks(), linked() and vertices[i].quat stay within that
+		bound ; quats(), xyz() and polar() still evaluate the whole Spiral.
+
+		vertices can not be set individually and the topology is always the
+		chain 0, 1, ... n-1
+	"""
+	def __init__(self, vertices, func, chunk = 1<<16, keep = 8, **kwargs ):
+		self._n = vertices
+		self.chunk = chunk
+		self.keep = keep
+		self._chunks = OrderedDict()	# { ( generation, chunk index ): components }
+		super().__init__( ComputedStore(), func, **kwargs )
+
+	def adapt(self, tolerance = None, max_length = None):
+		if tolerance is None and max_length is None:
+			return self
+		raise NotImplementedError("adaptive sampling needs the gamma of every vertex, use a Spiral")
+
+	def resize(self, n):
+		self._n = n
+		self.range_reset()
+
+	def range_reset(self):
+		self.len = self._n
+		self._gammas = None
+		self._chunks.clear()
+		self.invalidate()
+
+	@property
+	def edge_array(self):
+		""" built on demand, never kept """
+		return _chain( self.len )
+
+	@property
+	def edge_count(self):
+		return max( self.len-1, 0 )
+
+	def _chain(self):
+		pass
+
+	def _gamma_at(self, index):
+		start, stop = self._gamma_range[0][:2]
+		return start + ( stop-start )*np.asarray( index, dtype = float )/max( self.len-1, 1 )
+
+	def _eval_quats(self, start = 0, stop = None):
+		stop = self.len if stop is None else stop
+		return quaternion.as_float_array( self._default_quats( np.arange( start, stop ) ) )
+
+	def _default_quats(self, index = slice(None)):
+		if isinstance(index, slice):
+			index = np.arange( self.len )[index]
+		gammas = self._gamma_at( index )
+		return Quat.polar_array( self.func( gammas, **self.fargs ), gammas )
+
+	def _chunk(self, c):
+		""" components of chunk c, from the LRU if possible """
+		key = ( self.generation, c )
+		try:
+			self._chunks.move_to_end( key )
+			return self._chunks[key]
+		except KeyError:
+			pass
+		comps = self._eval( c*self.chunk, min( (c+1)*self.chunk, self.len ) )
+		self._chunks[key] = comps
+		while len(self._chunks) > self.keep:
+			self._chunks.popitem( last = False )
+		return comps
+
+	def window(self, start, stop):
+		first, last = start//self.chunk, ( stop-1 )//self.chunk
+		if stop <= start:
+			return np.empty( (0,4) )
+		if first == last:
+			return self._chunk( first )[ start-first*self.chunk:stop-first*self.chunk ]
+		return np.concatenate( [ self._chunk(c) for c in range( first, last+1 ) ] )[ start-first*self.chunk:stop-first*self.chunk ]
+
+	def chunks(self, size = None):
+		return super().chunks( self.chunk if size is None else size )
+
+	def extra_edges(self):
+		return np.empty( (0,2), dtype = np.int32 )
+
+	def linked(self, start, stop):
+		linked = np.ones( max( stop-start, 0 ), dtype = bool )
+		if start == 0 and len(linked):
+			linked[0] = False
+		return linked
 
 class Parastichy(Polytope):
 	"""
 		draws a path that follows a Parastichy https://en.wikipedia.org/wiki/Parastichy
 
 		(connects the seeds of a sunflower)
+
+		seed i lays at radius c*sqrt(i) and at i times the golden angle (Vogel's
+		model) ; the seeds are stored in that order, from the center outwards.
+		a family F joins every seed i to seed i+F, which draws F spirals
+		(parastichies) ; the visible ones are Fibonacci numbers.
 	"""
-	def __init__(self, npts, **kwargs ):
-		#self.samples = np.linspace( self.start, self.stop, npts)
-		r = pow(self.samples,1/2)
-		#vertices = [ Point( self, quat = quaternion.from_euler_angles( rr, 2*rr*np.pi )) for rr in r]
-		raise NotImplementedError
+	golden_angle = np.pi*( 3 - 5**.5 )
 
-		super().__init__( vertices,
-				edges = [(vertices[i], vertices[i+1]) for i in range(len(vertices)-1)],
-				faces = NotImplementedError,
-				**kwargs )
+	def __init__(self, npts, c = 1, families = None, angle = None, **kwargs ):
+		"""
+			npts: number of seeds
+			c: scale, the distance between neighbouring seeds is about c
+			families: F of the parastichies to connect ; defaults to the two
+				families whose edges are the shortest at the rim
+			angle: divergence angle between consecutive seeds, in radians
+		"""
+		self.c = c
+		self.angle = self.golden_angle if angle is None else angle
+		i = np.arange( npts )
+		comps = quaternion.as_float_array( Quat.polar_array( c*np.sqrt(i), i*self.angle ) )
+		kwargs.setdefault( 'name', 'Parastichy' )
+		super().__init__( VertexStore.from_quats( comps ), None, None, **kwargs )
+		self.families = self.visible_families() if families is None else tuple( families )
+		self.edges = np.concatenate( [ np.empty( (0,2), dtype = np.int32 ) ] + [ np.stack( ( i[:-F], i[F:] ), axis = -1 ) for F in self.families if 0 < F < npts ] )
+
+	def visible_families(self, count = 2):
+		"""
+			the `count` Fibonacci numbers F for which seeds i and i+F are the
+			closest, for the outer half of the seeds
+		"""
+		xy = self.xyz()[:,:2]
+		fib = [ 1, 2 ]
+		while fib[-1] + fib[-2] < self.len//2:
+			fib.append( fib[-1] + fib[-2] )
+		fib = [ F for F in fib if F < self.len//2 ] or [ 1 ]
+		outer = np.arange( self.len//2, self.len )
+		lengths = [ np.median( norm( xy[outer] - xy[outer-F] ) ) if len(outer) else 0 for F in fib ]
+		return tuple(sorted( fib[k] for k in np.argsort( lengths, kind = 'stable' )[:count] ))
+
+	def strands(self, F):
+		"""
+			the F parastichies of family F, CSR-style ( offsets, indices ) : the
+			seeds of strand s are indices[offsets[s]:offsets[s+1]], from the center
+			outwards, so that they can be walked one after the other
+		"""
+		i = np.arange( self.len )
+		indices = np.lexsort(( i, i % F )).astype( np.int32 )
+		offsets = np.zeros( F+1, dtype = np.int64 )
+		np.cumsum( np.bincount( i % F, minlength = F ), out = offsets[1:] )
+		return offsets, indices
 
-	def rotate(self):
-		raise NotImplementedError
+	def homotecy(self, f, center = None):
+		"""
+			scales all the seeds by `f`, relative to `center` (the origin by default)
+		"""
+		return self.scale( f, center )
 
-	def translate(self):
-		raise NotImplementedError
 
-	def homotecy(self):
-		raise NotImplementedError
+#################################
+#								#
+# composite shapes				#
+#								#
+#################################
+def _matrices( q ):
+	"""
+		(K,3,3) matrices of p -> q*p*q.conjugate() for (K,4) quaternion
+		components, ie. the rotation of q scaled by its squared norm
+	"""
+	columns = [ _qmul( _qmul( q, e ), q*( 1, -1, -1, -1 ) )[...,1:] for e in np.eye(4)[1:] ]
+	return np.stack( columns, axis = -1 )
+
+class Instances(ComputedPolytope):
+	"""
+		copies of a base Polytope placed at different poses, without copying it
+
+		instance k is the base rotated (and scaled by the squared norm) by the
+		quaternion rotations[k], then moved by offsets[k] (see Transform) ;
+		vertex j of instance k is vertex k*len(base)+j. only the base and the
+		(K,4) rotations and (K,3) offsets are held, everything else is
+		expanded when it is evaluated: window(), chunks() and linked() walk
+		through the instances with bounded memory, so G-code and toolpath
+		files are streamed ; quats(), xyz(), edge_array and triangles() expand
+		all of them. consecutive instances are joined by travel moves.
+
+		the base may still be modified, the instances follow. their vertices
+		can not be set individually and they have no attributes of their own.
+	"""
+	def __init__(self, base, rotations = None, offsets = None, name = None ):
+		"""
+			base: the Polytope to copy
+			rotations: (K,) np.quaternion or (K,4) components ; none by default
+			offsets: (K,3) translations ; none by default
+		"""
+		self.base = base
+		self.place( rotations, offsets, reset = False )
+		super().__init__( ComputedStore(), None, None, name = base.name if name is None else name )
+
+	def place(self, rotations = None, offsets = None, reset = True):
+		"""
+			sets the poses of all the instances ; the count is that of whichever
+			of rotations and offsets is given
+		"""
+		if rotations is not None and np.asarray(rotations).dtype == np.quaternion:
+			rotations = quaternion.as_float_array( rotations )
+		count = len( rotations if offsets is None else offsets ) if rotations is not None or offsets is not None else 1
+		self.rotations = np.tile( [ 1., 0, 0, 0 ], ( count, 1 ) ) if rotations is None else np.asarray( rotations, dtype = float ).reshape(-1,4)
+		self.offsets = np.zeros( (count,3) ) if offsets is None else np.asarray( offsets, dtype = float ).reshape(-1,3)
+		if len(self.rotations) != len(self.offsets):
+			raise ValueError(f"{len(self.rotations)} rotations for {len(self.offsets)} offsets")
+		if reset:
+			self.range_reset()
+		return self
+
+	@property
+	def count(self):
+		""" number of instances """
+		return len(self.offsets)
+
+	@property
+	def len(self):
+		return self.count*self.base.len
+
+	@property
+	def generation(self):
+		# stale as well when the base is, or when its vertices, edges or faces change
+		return ( self._generation, self.base.generation, self.base.edits, self.base.topology )
+
+	@generation.setter
+	def generation(self, generation):
+		self._generation = generation
+
+	def invalidate(self):
+		self._generation += 1
+
+	def range_reset(self):
+		self._gammas = None
+		self.invalidate()
+
+	def adapt(self, *args, **kwargs):
+		raise NotImplementedError("adapt the base instead")
+
+	def resize(self, n):
+		raise NotImplementedError("resize the base, or place() more instances")
 
+	def _tile(self, indices):
+		""" indices of base vertices, for every instance """
+		n = self.base.len
+		return ( indices[None] + n*np.arange( self.count ).reshape( (-1,) + (1,)*indices.ndim ) ).reshape( (-1,) + indices.shape[1:] )
+
+	@property
+	def edge_array(self):
+		""" built on demand, never kept """
+		return self._tile( self.base.edge_array ).astype( np.int32, copy = False )
+
+	@property
+	def edge_count(self):
+		return self.count*self.base.edge_count
+
+	@property
+	def face_offsets(self):
+		offsets = self.base.face_offsets
+		if offsets is None:
+			return None
+		steps = offsets[-1]*np.arange( self.count, dtype = np.int64 )
+		return np.concatenate(( ( offsets[:-1][None] + steps[:,None] ).ravel(), [ offsets[-1]*self.count ] ))
+
+	@property
+	def face_indices(self):
+		indices = self.base.face_indices
+		return None if indices is None else self._tile( indices ).astype( np.int32, copy = False )
+
+	def triangles(self):
+		return self._cached( 'triangles', lambda: self._tile( self.base.triangles() ) )
+
+	def extra_edges(self):
+		return self._tile( self.base.extra_edges() )
+
+	def linked(self, start, stop):
+		n = self.base.len
+		return self.base.linked( 0, n )[ np.arange( start, stop ) % n ]
+
+	def _eval_quats(self, start = 0, stop = None):
+		stop = self.len if stop is None else stop
+		n = self.base.len
+		index = np.arange( start, stop )
+		k = index//n
+		comps = _qmul( self.rotations[k], self.base.quats()[ index - k*n ] )
+		moved = self.offsets[k].any( axis = 1 )
+		if moved.any():
+			xyz = quats_xyz( comps[moved] )
+			comps[moved] = _move( comps[moved], xyz, xyz + self.offsets[k][moved] )
+		return comps
+
+	def frames(self):
+		"""
+			( positions (K,3), matrices (K,3,3) ) such that vertex p of the base
+			is at matrices[k] @ p + positions[k] in instance k, ie. for
+			instanced rendering ; None when the transform of the Instances is
+			not a similarity (a pinch)
+		"""
+		steps = self.transform.steps
+		if any( not isinstance(step, Similarity) for step in steps ):
+			return None
+		matrices, positions = _matrices( self.rotations ), self.offsets
+		for step in steps:
+			m = step.scale*_matrices( step.rotation[None] )[0]
+			matrices, positions = m @ matrices, positions @ m.T + step.translation
+		return positions, matrices
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	neighbour queries on the vertices of a Polytope
+
+	the points are hashed in a uniform grid of cubic cells (about two points
+	per cell), sorted by cell, so that the points of cell c are
+	order[starts[c]:starts[c+1]] ; every query only looks at a block of cells
+	around its own. queries are batched: all the candidates of a batch are
+	gathered and filtered with array operations, there is no per-point loop.
+
+	usage:
+		grid = GridIndex.from_polytope( shape )
+		distances, indices = grid.knn( points, 6 )
+		offsets, indices = grid.radius( points, 1.5 )
+		shape.edges = grid.pairs( 1.5 )
+"""
+
+import itertools
+import numpy as np
+
+class GridIndex:
+	"""
+		xyz: (N,3) array of points
+		cell: edge of a cell ; by default about two points per cell
+		batch: how many queries are processed at once (bounds memory)
+	"""
+	def __init__(self, xyz, cell = None, batch = 1<<15):
+		self.xyz = np.asarray( xyz, dtype = float ).reshape(-1,3)
+		self.batch = batch
+		n = len(self.xyz)
+		self.lo = self.xyz.min( axis = 0 ) if n else np.zeros(3)
+		extent = ( self.xyz.max( axis = 0 ) if n else np.zeros(3) ) - self.lo
+		if cell is None:
+			# flat point sets (ie. a Parastichy) use square cells
+			active = extent > 1e-9*max( extent.max(), 1e-300 )
+			cell = ( np.prod( extent[active] )*2/max( n, 1 ) )**( 1/active.sum() ) if active.any() else 1.
+		self.cell = cell
+		self.dims = np.floor( extent/cell ).astype( np.int64 ) + 1
+		keys = self._keys( self._cells( self.xyz ) )
+		self.order = np.argsort( keys, kind = 'stable' )
+		self.starts = np.searchsorted( keys[self.order], np.arange( np.prod( self.dims )+1 ) )
+		self.sorted = self.xyz[self.order]	# the points of a cell are contiguous
+
+	@classmethod
+	def from_polytope(cls, shape, **kwargs):
+		return cls( shape.xyz(), **kwargs )
+
+	def __len__(self):
+		return len(self.xyz)
+
+	def _cells(self, xyz):
+		""" integer cell coordinates, clipped to the grid """
+		return np.clip( np.floor( ( xyz - self.lo )/self.cell ).astype( np.int64 ), 0, self.dims-1 )
+
+	def _keys(self, cells):
+		return cells[...,0] + self.dims[0]*( cells[...,1] + self.dims[1]*cells[...,2] )
+
+	def _block(self, queries, m):
+		"""
+			candidates in the cells at most m cells away from each query:
+			( query index, slot ) pairs where slot is an index into self.sorted
+			(and self.order), and the distance from each query to the outside of
+			its block (inf where the block reaches the edges of the grid), within
+			which the candidates are all the points there are
+		"""
+		cells = self._cells( queries )
+		steps = [ range( -min( m, d-1 ), min( m, d-1 )+1 ) for d in self.dims ]
+		offsets = np.array( list( itertools.product( *steps ) ), dtype = np.int64 )
+		block = cells[:,None,:] + offsets[None,:,:]
+		inside = ( ( block >= 0 ) & ( block < self.dims ) ).all( axis = -1 )
+		q, b = np.nonzero( inside )
+		keys = self._keys( block[q, b] )
+		counts = self.starts[keys+1] - self.starts[keys]
+		first = np.repeat( self.starts[keys], counts )
+		within = np.arange( counts.sum() ) - np.repeat( np.cumsum(counts) - counts, counts )
+		slots = first + within
+
+		low = self.lo + ( cells - m )*self.cell
+		high = self.lo + ( cells + m + 1 )*self.cell
+		margin = np.minimum( np.where( cells - m > 0, queries - low, np.inf ), np.where( cells + m < self.dims-1, high - queries, np.inf ) )
+		return np.repeat( q, counts ), slots, margin.min( axis = 1 )
+
+	def _batches(self, queries):
+		queries = np.asarray( queries, dtype = float ).reshape(-1,3)
+		for start in range( 0, len(queries), self.batch ):
+			yield start, queries[start:start+self.batch]
+
+	def knn(self, queries, k):
+		"""
+			the k nearest points of each query, closest first ; returns
+			( distances, indices ), both (Q,k), padded with inf and -1 when there
+			are less than k points. a query that is one of the points is its own
+			nearest neighbour, ask for k+1 to skip it
+		"""
+		queries = np.asarray( queries, dtype = float ).reshape(-1,3)
+		distances = np.full( ( len(queries), k ), np.inf )
+		indices = np.full( ( len(queries), k ), -1, dtype = np.int64 )
+		for start, batch in self._batches( queries ):
+			pending = np.arange( len(batch) )
+			m = 1
+			while len(pending):
+				q, slots, margin = self._block( batch[pending], m )
+				d = np.sqrt( np.square( self.sorted[slots] - batch[pending][q] ).sum( axis = 1 ) )
+				# one row of candidates per query (q is sorted), inf-padded
+				counts = np.bincount( q, minlength = len(pending) )
+				column = np.arange( len(q) ) - np.repeat( np.cumsum(counts) - counts, counts )
+				width = max( counts.max( initial = 0 ), k )
+				rows_d = np.full( ( len(pending), width ), np.inf )
+				rows_i = np.full( ( len(pending), width ), -1, dtype = np.int64 )
+				rows_d[q, column] = d
+				rows_i[q, column] = slots
+				if width > k:
+					part = np.argpartition( rows_d, k-1, axis = 1 )[:,:k]
+					rows_d = np.take_along_axis( rows_d, part, axis = 1 )
+					rows_i = np.take_along_axis( rows_i, part, axis = 1 )
+				sort = np.argsort( rows_d, axis = 1 )
+				rows_d = np.take_along_axis( rows_d, sort, axis = 1 )
+				rows_i = np.take_along_axis( rows_i, sort, axis = 1 )
+				# final if nothing outside the block can be closer than the k-th
+				done = ( rows_d[:,-1] <= margin ) | np.isinf( margin )
+				distances[ start + pending[done] ] = rows_d[done]
+				indices[ start + pending[done] ] = np.where( rows_i[done] < 0, -1, self.order[ rows_i[done] ] )
+				pending = pending[~done]
+				m += 1
+		return distances, indices
+
+	def radius(self, queries, r, sort = True):
+		"""
+			the points within distance r of each query, CSR-style: those of query
+			i are indices[offsets[i]:offsets[i+1]], closest first unless sort is False
+		"""
+		queries = np.asarray( queries, dtype = float ).reshape(-1,3)
+		m = int( np.ceil( r/self.cell ) )
+		found_q, found = [], []
+		for start, batch in self._batches( queries ):
+			q, slots, _ = self._block( batch, m )
+			d = np.sqrt( np.square( self.sorted[slots] - batch[q] ).sum( axis = 1 ) )
+			near = d <= r
+			order = np.lexsort(( d[near], q[near] )) if sort else slice(None)	# q is sorted already
+			found_q.append( start + q[near][order] )
+			found.append( self.order[ slots[near][order] ] )
+		found_q = np.concatenate( found_q ) if found_q else np.empty( 0, dtype = np.int64 )
+		offsets = np.zeros( len(queries)+1, dtype = np.int64 )
+		np.cumsum( np.bincount( found_q, minlength = len(queries) ), out = offsets[1:] )
+		return offsets, np.concatenate( found ) if found else np.empty( 0, dtype = np.int64 )
+
+	def pairs(self, r):
+		"""
+			(E,2) int32 array of the pairs i < j of points within distance r, ie.
+			to be used as edges
+		"""
+		offsets, indices = self.radius( self.xyz, r, sort = False )
+		i = np.repeat( np.arange( len(self) ), np.diff( offsets ) )
+		keep = i < indices
+		return np.stack( ( i[keep], indices[keep] ), axis = -1 ).astype( np.int32 )
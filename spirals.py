@@ -80,3 +80,31 @@ def Involute( phi, **kwargs ):
 	"""
 	raise NotImplementedError
 
+
+def adaptive( start, stop, func, tolerance = None, max_length = None, oversample = 1<<16, **kwargs ):
+	"""
+		values of phi between start and stop for the spiral func( phi, **kwargs ),
+		spaced so that each chord deviates at most `tolerance` from the curve and/or
+		is at most `max_length` long ; tight turns get more points, flat ones fewer
+
+		the curve is sampled `oversample` times to estimate its arc length and
+		curvature, the points are then placed by inverting the cumulative number
+		of points needed (a chord of length s on a curvature c deviates c*s**2/8)
+	"""
+	phi = np.linspace( start, stop, oversample )
+	with np.errstate( divide = 'ignore', invalid = 'ignore' ):
+		r = func( phi, **kwargs )
+		dr = np.gradient( r, phi )
+		ddr = np.gradient( dr, phi )
+		ds = np.hypot( r, dr )	# arc length per radian
+		density = np.zeros_like( phi )
+		if tolerance is not None:
+			curvature = np.abs( r*r + 2*dr*dr - r*ddr )/ds**3
+			density = np.fmax( density, ds*np.sqrt( curvature/(8*tolerance) ) )
+		if max_length is not None:
+			density = np.fmax( density, ds/max_length )
+	density[ ~np.isfinite(density) ] = 0	# singularities (ie. Hyperbolic at 0) cannot be drawn anyway
+
+	needed = np.concatenate(( [0], np.cumsum( (density[1:]+density[:-1])/2*np.diff(phi) ) ))
+	n = int( np.ceil( needed[-1] ) ) + 1
+	return np.interp( np.linspace( 0, needed[-1], max( n, 2 ) ), needed, phi )
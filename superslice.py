@@ -78,7 +78,7 @@ class NothingToShow(Exception): pass
 
 print("superslice test/example\n")
 
-from primitives import Polytope, Polygon, Spiral, Parastichy
+from primitives import Polytope, Polygon, Spiral, Parastichy, Instances
 from platonic import Tetrahedron, Cube, Octahedron, Dodecahedron, Icosahedron
 from tilings import TriGrid, QuadDrid, HexGrid, Penrose, Quasicrystal
 
@@ -96,6 +96,11 @@ shapes = [
 		#Spiral( 12, ('Fibonacci', {'a':2, }) ),
 		#Spiral( 12, ('Theodorus', {'a':2, }) ),
 		#Spiral( 12, ('Involute', {'a':2, }) ),
+		#Parastichy( 1000 ),
+
+		#Polygon( 1, 6 ),
+		#Polygon( 1, 5, convexity = 2 ),
+		#Polygon( 1, 100000 ),
 
 		# Here are some Polygons
 		#Tetrahedron(),
@@ -103,6 +108,16 @@ shapes = [
 		#Octahedron(),
 		#Dodecahedron(),
 		#Icosahedron(),
+
+		# Here are some tilings
+		#TriGrid( 1, (0, 0, 100, 100) ),
+		#QuadDrid( 1, (0, 0, 100, 100) ),
+		#HexGrid( 1, (-100, -100, 100, 100), region = lambda z: abs(z) < 100 ),
+		#Penrose( 100, 12, clip = 50 ),
+		#Quasicrystal( 20, 2 ),
+
+		# Here are copies of a Polytope, placed without copying it
+		#Instances( Dodecahedron(), offsets = [ ( 4*i, 4*j, 0 ) for i in range(30) for j in range(30) ] ),
 	]
 
 for shape in shapes:
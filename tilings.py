@@ -2,25 +2,148 @@
 # -*- coding: utf-8 -*-
 # vim: noet ts=4 ai number
 
+import numpy as np
+from primitives import Polytope, VertexStore, xyz_quats
+
+def _flat( points ):
+	"""
+		(N,4) quaternion components of an array of complex points on the xy plane
+
+		same as Quat.polar_array( abs(p), angle(p) ) : a rotation around z by
+		angle(p), scaled by sqrt(abs(p)), which is the complex sqrt(p)
+	"""
+	root = np.sqrt( points )
+	comps = np.zeros( ( len(points), 4 ) )
+	comps[:,0] = root.real
+	comps[:,3] = root.imag
+	return comps
+
 #################################
 #								#
 # periodic tilings				#
 #								#
 #################################
-class TriGrid:
+class Lattice(Polytope):
+	"""
+		base of the periodic tilings
+
+		the vertices are the points (i,j) of an infinite lattice, with positions
+		given by position() ; edges and faces are given as lattice offsets.
+		everything is built over the whole (i,j) range at once and only what
+		lays inside the region is kept, so that every vertex exists only once
+		and shared vertices are deduplicated by construction.
+
+		vertices are stored row by row, every other row reversed (serpentine),
+		so that the path along a row is continuous
+
+		r: radius of the circle each cell fits in
+		bounds: ( xmin, ymin, xmax, ymax ) of the region to fill
+		region: optional function of an array of complex positions, returning
+			True for the vertices to keep (ie. a circular plate)
+	"""
+	edge_templates = ()	# ( di, dj, parity ) ; parity (of i+j) is None for all vertices
+	face_templates = ()	# ( ( (di, dj), ... ), parity ) ; all faces have the same count of vertices
+
+	def __init__(self, r = 1, bounds = (0, 0, 100, 100), region = None, **kwargs ):
+		self.r = r
+		self.bounds = bounds
+		xmin, ymin, xmax, ymax = bounds
+		I, J = np.meshgrid( *self.span( xmax-xmin, ymax-ymin ), indexing = 'xy' )	# (j,i)
+		points = complex( xmin, ymin ) + self.position( I, J )
+		eps = 1e-9*r
+		inside = ( points.real >= xmin-eps ) & ( points.real <= xmax+eps ) & ( points.imag >= ymin-eps ) & ( points.imag <= ymax+eps )
+		if region is not None:
+			inside &= region( points )
+
+		order = np.arange( I.size ).reshape( I.shape )
+		order[1::2] = order[1::2,::-1]
+		order = order.ravel()
+		order = order[ inside.ravel()[order] ]
+		index = np.full( I.shape, -1, dtype = np.int64 )
+		index.ravel()[order] = np.arange( len(order) )
+		padded = np.pad( index, 2, constant_values = -1 )
+		parity = ( I + J ) % 2
+		def at( di, dj ):
+			return padded[ 2+dj:2+dj+I.shape[0], 2+di:2+di+I.shape[1] ]
+
+		edges = []
+		for di, dj, p in self.edge_templates:
+			a, b = index, at( di, dj )
+			keep = ( a >= 0 ) & ( b >= 0 ) & ( True if p is None else parity == p )
+			edges.append( np.stack( ( a[keep], b[keep] ), axis = -1 ) )
+		faces = []
+		for offsets, p in self.face_templates:
+			corners = [ at( di, dj ) for di, dj in offsets ]
+			keep = np.logical_and.reduce([ c >= 0 for c in corners ]) & ( True if p is None else parity == p )
+			faces.append( np.stack([ c[keep] for c in corners ], axis = -1 ) )
+		faces = np.concatenate( faces )
+		k = faces.shape[1]
+
+		kwargs.setdefault( 'name', type(self).__name__ )
+		super().__init__( VertexStore.from_quats( _flat( points.ravel()[order] ) ),
+				np.concatenate( edges ).astype( np.int32 ),
+				( np.arange( len(faces)+1, dtype = np.int64 )*k, faces.ravel().astype( np.int32 ) ),
+				**kwargs )
+
+	def span(self, width, height):
+		""" ranges of i and j that cover a width x height rectangle """
+		raise NotImplementedError
+
+	def position(self, i, j):
+		""" complex position of lattice point (i,j), relative to (xmin, ymin) """
+		raise NotImplementedError
+
+class TriGrid(Lattice):
 	"""
 		draws a triangular grid where each cell fits inside a circle of radius 'r'
 	"""
+	edge_templates = ( (1, 0, None), (0, 1, None), (-1, 1, None) )
+	face_templates = (
+			( ( (0, 0), (1, 0), (0, 1) ), None ),	# pointing up
+			( ( (1, 0), (1, 1), (0, 1) ), None ),	# pointing down
+		)
+
+	def span(self, width, height):
+		s = self.r*3**.5
+		rows = int( height/( s*3**.5/2 ) ) + 1
+		return np.arange( -(rows//2)-1, int( width/s )+2 ), np.arange( rows )
 
-class QuadDrid:
+	def position(self, i, j):
+		# skewed lattice: row j is shifted by half a side every row
+		s = self.r*3**.5
+		return s*( i + j/2 ) + 1j*s*3**.5/2*j
+
+class QuadDrid(Lattice):
 	"""
 		draws a square grid where each cell fits inside a circle of radius 'r'
 	"""
+	edge_templates = ( (1, 0, None), (0, 1, None) )
+	face_templates = ( ( ( (0, 0), (1, 0), (1, 1), (0, 1) ), None ), )
+
+	def span(self, width, height):
+		s = self.r*2**.5
+		return np.arange( int( width/s )+2 ), np.arange( int( height/s )+2 )
+
+	def position(self, i, j):
+		s = self.r*2**.5
+		return s*i + 1j*s*j
 
-class HexGrid:
+class HexGrid(Lattice):
 	"""
 		draws a hexagonal grid where each cell fits inside a circle of radius 'r'
+
+		the hexagons are pointy-topped ; vertex (i,j) belongs to the zigzag row
+		j, at the bottom of a hexagon when i+j is even, at the top of one when
+		it is odd
 	"""
+	edge_templates = ( (1, 0, None), (0, 1, 1) )	# along the zigzag rows, then up
+	face_templates = ( ( ( (0, 0), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0) ), 0 ), )
+
+	def span(self, width, height):
+		return np.arange( int( width/( self.r*3**.5/2 ) )+2 ), np.arange( int( height/( 1.5*self.r ) )+2 )
+
+	def position(self, i, j):
+		return self.r*3**.5/2*i + 1j*self.r*( 1.5*j + .5*( ( i + j ) % 2 ) )
 
 
 #################################
@@ -28,13 +151,194 @@ class HexGrid:
 # aperiodic tilings				#
 #								#
 #################################
-class Penrose:
+class Penrose(Polytope):
 	"""
 		draws a Penrose tiling where the Pentagon fits inside a circle of radius 'r'
+
+		P3 tiling (thin and thick rhombs), by deflation of Robinson triangles:
+		a wheel of 10 thin triangles ABC (A at the center) is subdivided `depth`
+		times, every triangle of a generation in a single pass over complex
+		arrays. AB and AC are edges of the tiles, BC is the diagonal along which
+		two mirrored triangles make a rhomb.
+
+		r: radius of the initial wheel
+		depth: number of deflations ; the tiles shrink by phi every time
+		clip: None, a radius (disc around the origin) or ( xmin, ymin, xmax,
+			ymax ) ; triangles that are out of it are dropped at every step (so
+			that memory follows the clipped area, not the whole wheel) and only
+			the tiles that are entirely in it are kept in the end
+
+		tiles cut in half by the border of the wheel or of clip are triangles,
+		the other faces are rhombs
 	"""
+	phi = (1 + 5**.5)/2
+
+	def __init__(self, r = 1, depth = 5, clip = None, **kwargs ):
+		self.r, self.depth, self.clip = r, depth, clip
+		i = np.arange(10)
+		b = r*np.exp( 1j*( 2*i - 1 )*np.pi/10 )
+		c = r*np.exp( 1j*( 2*i + 1 )*np.pi/10 )
+		mirror = i % 2 == 0
+		thin = np.ones( 10, dtype = bool )
+		A, B, C = np.zeros( 10, dtype = complex ), np.where( mirror, c, b ), np.where( mirror, b, c )
+
+		for step in range( depth ):
+			keep = ~self._outside( A, B, C )
+			thin, A, B, C = thin[keep], A[keep], B[keep], C[keep]
+			A, B, C, thin = self.deflate( thin, A, B, C )
+		keep = self._inside( A, B, C )
+		thin, A, B, C = thin[keep], A[keep], B[keep], C[keep]
+
+		# shared corners are the same points up to rounding (a millionth of a side)
+		corners = np.stack( ( A, B, C ), axis = -1 ).ravel()
+		quantum = r*self.phi**-depth*1e-6
+		keys = np.round( corners.real/quantum ) + 1j*np.round( corners.imag/quantum )
+		_, first, inverse = np.unique( keys, return_index = True, return_inverse = True )
+		a, b, c = inverse.reshape(-1,3).T.astype( np.int64 )
+		points = corners[first]
+		n = len(points)
+
+		tile_edges = np.unique( np.concatenate(( np.minimum( a, b )*n + np.maximum( a, b ), np.minimum( a, c )*n + np.maximum( a, c ) )) )
+		edges = np.stack( ( tile_edges // n, tile_edges % n ), axis = -1 )
+
+		# triangles sharing their BC side make a rhomb A B A' C
+		_, pair, counts = np.unique( np.minimum( b, c )*n + np.maximum( b, c ), return_inverse = True, return_counts = True )
+		order = np.argsort( pair, kind = 'stable' )
+		paired = counts[ pair[order] ] == 2
+		first_of, second_of = order[paired][0::2], order[paired][1::2]
+		rhombs = np.stack( ( a[first_of], b[first_of], a[second_of], c[first_of] ), axis = -1 )
+		halves = order[~paired]
+		triangles = np.stack( ( a[halves], b[halves], c[halves] ), axis = -1 )
+		loops = [ self._ccw( points, rhombs ), self._ccw( points, triangles ) ]
+		offsets = np.concatenate(( [0], 4 + np.zeros( len(rhombs), dtype = np.int64 ), 3 + np.zeros( len(triangles), dtype = np.int64 ) )).cumsum()
+		indices = np.concatenate([ loop.ravel() for loop in loops ]).astype( np.int32 )
+
+		kwargs.setdefault( 'name', 'Penrose' )
+		super().__init__( VertexStore.from_quats( _flat( points ) ), edges.astype( np.int32 ), ( offsets, indices ), **kwargs )
+
+	@classmethod
+	def deflate(cls, thin, A, B, C):
+		"""
+			one subdivision of Robinson triangles ; returns A, B, C, thin of the
+			next generation: a thin triangle makes a thin and a thick one, a thick
+			triangle two thick ones and a thin one
+		"""
+		t, k = thin, ~thin
+		P = A[t] + ( B[t] - A[t] )/cls.phi
+		Q = B[k] + ( A[k] - B[k] )/cls.phi
+		R = B[k] + ( C[k] - B[k] )/cls.phi
+		return (
+			np.concatenate(( C[t], P, R, Q, R )),
+			np.concatenate(( P, C[t], C[k], R, Q )),
+			np.concatenate(( B[t], A[t], A[k], B[k], A[k] )),
+			np.repeat( [ True, False, False, False, True ], [ t.sum(), t.sum(), k.sum(), k.sum(), k.sum() ] ),
+		)
 
-class Quasicrystal:
+	def _outside(self, A, B, C):
+		""" True for the triangles that are surely out of clip """
+		if self.clip is None:
+			return np.zeros( len(A), dtype = bool )
+		corners = np.stack( ( A, B, C ), axis = -1 )
+		if np.isscalar( self.clip ):
+			center = corners.mean( axis = 1 )
+			return np.abs(center) - np.abs( corners - center[:,None] ).max( axis = 1 ) > self.clip
+		xmin, ymin, xmax, ymax = self.clip
+		return ( corners.real.max( axis = 1 ) < xmin ) | ( corners.real.min( axis = 1 ) > xmax ) | ( corners.imag.max( axis = 1 ) < ymin ) | ( corners.imag.min( axis = 1 ) > ymax )
+
+	def _inside(self, A, B, C):
+		""" True for the triangles that are entirely in clip """
+		if self.clip is None:
+			return np.ones( len(A), dtype = bool )
+		corners = np.stack( ( A, B, C ), axis = -1 )
+		if np.isscalar( self.clip ):
+			return ( np.abs(corners) <= self.clip ).all( axis = 1 )
+		xmin, ymin, xmax, ymax = self.clip
+		return ( ( corners.real >= xmin ) & ( corners.real <= xmax ) & ( corners.imag >= ymin ) & ( corners.imag <= ymax ) ).all( axis = 1 )
+
+	@staticmethod
+	def _ccw(points, loops):
+		""" loops (F,k), reversed where they turn clockwise """
+		p = points[loops]
+		area = ( p.real*np.roll( p.imag, -1, axis = 1 ) - np.roll( p.real, -1, axis = 1 )*p.imag ).sum( axis = 1 )
+		return np.where( area[:,None] < 0, loops[:,::-1], loops )
+
+class Quasicrystal(Polytope):
 	"""
 		draws a Quasicrystal structure where the Dodecahedron fits inside a sphere of radius 'r'
+
+		icosahedral quasicrystal (3D Penrose tiling of thick and thin
+		rhombohedra) by cut-and-project: the points n of the 6D lattice Z^6 are
+		projected on a 3D "parallel" space, spanned by the 6 axes of the
+		icosahedron, and on the orthogonal "perpendicular" space, where phi
+		becomes -1/phi ; n is a vertex if its perpendicular projection falls in
+		the window (the projection of the unit 6-cube, a rhombic
+		triacontahedron) and its parallel projection in the sphere.
+
+		the lattice points in the 6D ball that can reach both are enumerated
+		`chunk` at a time, so memory only depends on what is kept. two vertices are joined by an edge when they
+		differ by a unit vector of Z^6 (found by looking up sorted keys).
+
+		r: radius of the sphere
+		edge: length of the edges of the rhombohedra (r/4 by default)
+		offset: shift of the window, any generic value keeps lattice points off
+			its faces ; different offsets give different (locally similar) tilings
 	"""
+	phi = (1 + 5**.5)/2
+
+	def __init__(self, r = 1, edge = None, offset = ( 1e-3, 2.3e-3, 3.7e-3 ), chunk = 1<<18, **kwargs ):
+		self.r = r
+		self.edge = r/4 if edge is None else edge
+		par, perp = self.projections()
+		radius = r/( self.edge*2**.5 )	# a unit step of Z^6 is 1/sqrt(2) long in parallel space
+
+		# faces of the window are normal to the cross products of pairs of axes
+		normals = np.array([ np.cross( perp[i], perp[j] ) for i in range(6) for j in range( i+1, 6 ) ])
+		bounds = np.abs( normals @ perp.T ).sum( axis = 1 )/2
+		reach = radius**2 + ( np.linalg.norm( perp, axis = 1 ).sum()/2 )**2	# |n|^2 = |par|^2 + |perp|^2
+		K = int( reach**.5 )
+		side = 2*K + 1
+
+		# n = (a, b) where a and b are points of Z^3 in the ball of radius K ;
+		# `chunk` candidates (a, b) are tested at a time
+		grid = np.stack( np.unravel_index( np.arange( side**3 ), (side,)*3 ), axis = -1 ) - K
+		ball = grid[ np.square(grid).sum( axis = 1 ) <= reach ]
+		norms = np.square(ball).sum( axis = 1 )
+		b_par, b_perp = ball @ par[3:], ball @ perp[3:] - offset
+		group = max( 1, chunk//len(ball) )
+		found = []
+		for start in range( 0, len(ball), group ):
+			a = ball[start:start+group]
+			i, j = np.nonzero( norms[start:start+group,None] + norms[None,:] <= reach )
+			x = ( a @ perp[:3] )[i] + b_perp[j]
+			keep = ( np.abs( x @ normals.T ) <= bounds ).all( axis = 1 )
+			i, j = i[keep], j[keep]
+			keep = np.square( ( a @ par[:3] )[i] + b_par[j] ).sum( axis = 1 ) <= radius**2
+			found.append( np.concatenate(( a[i[keep]], ball[j[keep]] ), axis = 1 ) )
+		n = np.concatenate( found )
+
+		# vertices sorted by key, neighbours are looked up by key
+		weights = side**np.arange(6, dtype = np.int64)
+		keys = ( n + K ) @ weights
+		order = np.argsort( keys )
+		n, keys = n[order], keys[order]
+		edges = []
+		for axis in range(6):
+			target = keys + weights[axis]
+			at = np.minimum( np.searchsorted( keys, target ), len(keys)-1 )
+			hit = ( keys[at] == target ) & ( n[:,axis] < K )
+			edges.append( np.stack( ( np.flatnonzero(hit), at[hit] ), axis = -1 ) )
+
+		kwargs.setdefault( 'name', 'Quasicrystal' )
+		super().__init__( VertexStore.from_quats( xyz_quats( self.edge*2**.5*( n @ par ) ) ),
+				np.concatenate( edges ).astype( np.int32 ), None, **kwargs )
 
+	@classmethod
+	def projections(cls):
+		"""
+			( par, perp ), the (6,3) images of the unit vectors of Z^6 in parallel
+			and perpendicular space ; together they make an orthogonal 6x6 matrix
+		"""
+		def axes( t ):
+			a = np.array([ (1, t, 0), (-1, t, 0), (0, 1, t), (0, -1, t), (t, 0, 1), (t, 0, -1) ], dtype = float )
+			return a/np.linalg.norm( a, axis = 1 )[:,None]/2**.5
+		return axes( cls.phi ), axes( -1/cls.phi )
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	binary container for Polytopes
+
+	layout of a file:
+		MAGIC					8 bytes
+		header length			uint64, little endian
+		header					JSON: name, vertex count, layer height and a
+								table of { array: ( dtype, shape, offset ) }
+		arrays					raw, C order, each one at an offset that is a
+								multiple of ALIGN
+
+	the arrays are the quaternion components (N,4), the attribute columns that
+	are set ("attr.color", ...), the edges (E,2), the faces (CSR offsets and
+	indices), the triangles and the layer index (see Polytope.layers).
+
+	opening a file maps the arrays with np.memmap, nothing is read until it is
+	used, so huge toolpaths can be sliced, drawn or streamed to G-code (see
+	Polytope.chunks) with bounded memory.
+"""
+
+import json
+import struct
+import numpy as np
+from primitives import Polytope, Layers
+
+MAGIC = b'SSLICE\x00\x01'
+ALIGN = 64
+LENGTH = struct.Struct('<Q')
+
+def _align( offset ):
+	return -( -offset // ALIGN ) * ALIGN
+
+def save( shape, path, layers = True, chunk = 1<<16 ):
+	"""
+		writes `shape` to `path` ; the vertices are evaluated `chunk` at a time,
+		layers=False skips the layer index (which needs all of xyz at once)
+	"""
+	arrays = shape.arrays( quats = False )
+	if shape.face_offsets is not None:
+		arrays['triangles'] = shape.triangles()
+	if layers:
+		index = shape.layers()
+		for field in Layers._fields[1:]:
+			arrays['layers.'+field] = getattr( index, field )
+
+	table = { 'quats': ( '<f8', ( shape.len, 4 ) ) }
+	table.update( ( name, ( array.dtype.str, array.shape ) ) for name, array in arrays.items() )
+	header = { 'name': shape.name, 'vertices': shape.len, 'layer_height': shape.layer_height, 'arrays': {} }
+	# the header holds the offsets, which depend on its own length: reserve
+	# room for it first
+	start = len(MAGIC) + LENGTH.size + len( json.dumps({ **header, 'arrays': { n: ( d, s, 2**63 ) for n, ( d, s ) in table.items() } }).encode() )
+	offset = _align( start )
+	for name, ( dtype, shape_ ) in table.items():
+		header['arrays'][name] = ( dtype, shape_, offset )
+		offset = _align( offset + np.dtype(dtype).itemsize * int( np.prod( shape_ ) ) )
+	encoded = json.dumps( header ).encode()
+	encoded += b' ' * ( start - len(MAGIC) - LENGTH.size - len(encoded) )
+
+	with open( path, 'wb' ) as fh:
+		fh.write( MAGIC + LENGTH.pack( len(encoded) ) + encoded )
+		def seek( name ):
+			fh.write( b'\0' * ( header['arrays'][name][2] - fh.tell() ) )
+		seek( 'quats' )
+		for _, comps in shape.chunks( chunk ):
+			fh.write( np.ascontiguousarray( comps, dtype = '<f8' ).tobytes() )
+		for name, array in arrays.items():
+			seek( name )
+			fh.write( np.ascontiguousarray( array, dtype = header['arrays'][name][0] ).tobytes() )
+		fh.truncate( _align( fh.tell() ) )
+
+def open_arrays( path, mode = 'r' ):
+	"""
+		( header, { name: np.memmap } ) of a file written by save()
+	"""
+	with open( path, 'rb' ) as fh:
+		if fh.read( len(MAGIC) ) != MAGIC:
+			raise ValueError( f"{path} is not a superslice toolpath" )
+		length, = LENGTH.unpack( fh.read( LENGTH.size ) )
+		header = json.loads( fh.read( length ) )
+	arrays = {}
+	for name, ( dtype, shape, offset ) in header['arrays'].items():
+		if 0 in shape:
+			arrays[name] = np.empty( shape, dtype = dtype )	# mmap can not map nothing
+		else:
+			arrays[name] = np.memmap( path, dtype = dtype, mode = mode, offset = offset, shape = tuple(shape) )
+	return header, arrays
+
+def load( path, mode = 'c' ):
+	"""
+		the Polytope saved in `path`, backed by memory-mapped arrays ; with the
+		default copy-on-write mode it can still be modified, the file never is
+	"""
+	header, arrays = open_arrays( path, mode )
+	shape = Polytope.from_dict( arrays, name = header['name'] )
+	shape.layer_height = header['layer_height']
+	# derived arrays that were saved along need not be computed again
+	if 'triangles' in arrays:
+		shape._cache['triangles'] = ( shape.generation, arrays['triangles'] )
+	if 'layers.vertex_order' in arrays:
+		index = Layers( len( arrays['layers.vertex_offsets'] )-1, *[ arrays['layers.'+field] for field in Layers._fields[1:] ] )
+		shape._cache[( 'layers', shape.layer_height )] = ( shape.generation, index )
+	return shape
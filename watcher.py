@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: noet ts=4 ai number
+
+"""
+	file watcher used by the GUI to reload a slice script as soon as it (or one
+	of the modules it uses) is saved
+
+	uses inotify on linux, polls modification times elsewhere
+"""
+
+import ctypes
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from importlib import reload
+from traceback import print_exc
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_CLOEXEC = 0o2000000
+EVENT = struct.Struct('iIII')	# wd, mask, cookie, len ; followed by the name
+
+def tracked_modules( script ):
+	"""
+		the modules `script` uses that live next to it or next to superslice
+		(primitives, platonic, spirals...), the script itself included
+	"""
+	here = os.path.dirname( os.path.abspath(__file__) )
+	there = os.path.dirname( os.path.abspath(script.__file__) )
+	modules = []
+	for name, module in list( sys.modules.items() ):
+		path = getattr( module, '__file__', None )
+		if path is None or name in ( '__main__', 'gui', __name__ ):
+			continue
+		if os.path.dirname( os.path.abspath(path) ) in ( here, there ):
+			modules.append( module )
+	return modules
+
+def reload_modules( modules ):
+	"""
+		reloads modules after the ones they depend on, so that ie. platonic
+		picks up the classes of the freshly reloaded primitives
+	"""
+	modules = { m.__name__: m for m in modules }
+	done = set()
+	def visit( module ):
+		if module.__name__ in done:
+			return
+		done.add( module.__name__ )
+		for value in list( vars(module).values() ):
+			dep = value.__name__ if type(value) is type(module) else getattr( value, '__module__', None )
+			if dep in modules:
+				visit( modules[dep] )
+		reload( module )
+	for module in list( modules.values() ):
+		visit( module )
+
+class Watcher:
+	"""
+		calls callback() (from its own thread) once the watched files have not
+		changed for `debounce` seconds, so that a burst of writes only triggers
+		it once
+
+		files: paths to watch ; the parent directories are watched with inotify
+			because many editors replace a file rather than writing to it
+		interval: polling period, when inotify is not available
+	"""
+	def __init__(self, files, callback, debounce = .1, interval = 1):
+		self.callback = callback
+		self.debounce = debounce
+		self.interval = interval
+		self.files = set()
+		self.mtimes = {}
+		self._wake_r, self._wake_w = os.pipe()
+		self._stopped = False
+		self._wds = {}
+		self._fd = self._inotify()
+		self.watch( files )
+		self._thread = threading.Thread( target = self._run, name = 'watcher', daemon = True )
+		self._thread.start()
+
+	def _inotify(self):
+		if not sys.platform.startswith('linux'):
+			return None
+		try:
+			libc = ctypes.CDLL( None, use_errno = True )
+			fd = libc.inotify_init1( IN_CLOEXEC )
+		except (OSError, AttributeError):
+			return None
+		if fd < 0:
+			return None
+		self._libc = libc
+		return fd
+
+	def watch(self, files):
+		"""
+			replaces the set of watched files
+		"""
+		self.files = { os.path.abspath(f) for f in files }
+		self.mtimes = { f: self._mtime(f) for f in self.files }
+		if self._fd is None:
+			return
+		for directory in { os.path.dirname(f) for f in self.files } - set( self._wds.values() ):
+			wd = self._libc.inotify_add_watch( self._fd, os.fsencode(directory), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE )
+			if wd >= 0:
+				self._wds[wd] = directory
+
+	def stop(self):
+		self._stopped = True
+		os.write( self._wake_w, b'x' )
+		self._thread.join()
+		if self._fd is not None:
+			os.close( self._fd )
+
+	@staticmethod
+	def _mtime(path):
+		try:
+			return os.path.getmtime(path)
+		except OSError:
+			# file is probably being rewritten right now
+			return None
+
+	def _changed(self):
+		""" True if a watched file was touched """
+		if self._fd is None:
+			mtimes = { f: self._mtime(f) for f in self.files }
+			changed = mtimes != self.mtimes
+			self.mtimes = mtimes
+			return changed
+
+		data = os.read( self._fd, 64*1024 )
+		changed = False
+		while data:
+			wd, mask, cookie, length = EVENT.unpack_from( data )
+			name = data[EVENT.size:EVENT.size+length].rstrip(b'\0')
+			data = data[EVENT.size+length:]
+			if wd in self._wds and os.path.join( self._wds[wd], os.fsdecode(name) ) in self.files:
+				changed = True
+		return changed
+
+	def _run(self):
+		pending = None	# time at which the callback is due
+		while not self._stopped:
+			if pending is None:
+				timeout = None if self._fd is not None else self.interval
+			else:
+				timeout = max( pending - time.monotonic(), 0 )
+			sources = [ self._wake_r ] + ( [ self._fd ] if self._fd is not None else [] )
+			ready, _, _ = select.select( sources, [], [], timeout )
+			if self._stopped:
+				break
+			if ( self._fd is None or self._fd in ready ) and self._changed():
+				pending = time.monotonic() + self.debounce
+			elif pending is not None and time.monotonic() >= pending:
+				pending = None
+				try:
+					self.callback()
+				except Exception:
+					print_exc()